@@ -0,0 +1,313 @@
+"""
+An asyncio client for the Pexip Manager and Conferencing Node bootstrap API, for embedding
+within orchestration services. Every call takes explicit parameters, returns its result or
+raises one of the exceptions within 'pexip.exceptions', and never prints or exits.
+"""
+import json
+import time
+import random
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from . import metrics, tracing
+from .cli.definitions import REQUIRED_CREATE_ARGS
+from .decode import iter_listing
+from .exceptions import (
+    ConfigurationNotFound,
+    ManagerRequestError,
+    MissingArgumentError,
+    NodeCreationError,
+    NodeDeletionError,
+    ProvisioningError,
+    TranscoderAlreadyExists,
+    TranscoderInUse,
+    TranscoderNotFound,
+)
+from .definitions import (
+    API_MAP,
+    BOOTSTRAP_PORT,
+    BOOTSTRAP_RETRY_STATUSES,
+    BOOTSTRAP_URL,
+    DEFAULT_BOOTSTRAP_DEADLINE,
+    DEFAULT_BOOTSTRAP_PARALLEL,
+    DEFAULT_BOOTSTRAP_POLL_INTERVAL,
+    DEFAULT_CREATE_DATA,
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_POOL_MAXSIZE,
+    STATUS_MAP,
+)
+from .limiter import ManagerLimiter, paced_request
+from .payload import open_body
+from .provision import is_reachable
+from .utils import pooled_session
+
+
+class AsyncPexipClient:
+    """Drive many nodes through the Manager and their bootstrap API from one event loop.
+
+    Node operations are coroutines, so thousands may be in flight at once. Blocking HTTP
+    calls are handed to two small thread pools, 'concurrency' threads for the Manager and
+    'bootstrap_concurrency' for the nodes, and a thread is only held while a request is in
+    flight: nodes waiting to boot sleep on the event loop between polls.
+
+    Requests to the Manager are paced by 'limiter', adaptive concurrency by default (see
+    ManagerLimiter). Lookups are answered from one listing per endpoint, fetched on first
+    use and kept up to date as nodes are created and deleted through this client.
+    """
+
+    routes = {**API_MAP, **STATUS_MAP}
+
+    def __init__(
+        self,
+        manager_url,
+        username,
+        password,
+        verify=True,
+        page_size=DEFAULT_PAGE_SIZE,
+        concurrency=DEFAULT_POOL_MAXSIZE,
+        bootstrap_concurrency=DEFAULT_BOOTSTRAP_PARALLEL,
+        bootstrap_deadline=DEFAULT_BOOTSTRAP_DEADLINE,
+        bootstrap_poll_interval=DEFAULT_BOOTSTRAP_POLL_INTERVAL,
+        bootstrap_url=BOOTSTRAP_URL,
+        bootstrap_port=BOOTSTRAP_PORT,
+        limiter=None,
+    ):
+        self.url = manager_url.rstrip("/")
+        self.verify = verify
+        self.page_size = page_size
+        self.bootstrap_deadline = bootstrap_deadline
+        self.bootstrap_poll_interval = bootstrap_poll_interval
+        self.bootstrap_url = bootstrap_url
+        self.bootstrap_port = bootstrap_port
+        self.limiter = limiter or ManagerLimiter(max_concurrency=concurrency)
+
+        self.session = pooled_session(pool_connections=1, pool_maxsize=concurrency)
+        self.session.auth = (username, password)
+        # Freshly launched nodes have self-signed certificates.
+        requests.packages.urllib3.disable_warnings()
+        self.bootstrap_session = pooled_session(
+            pool_connections=bootstrap_concurrency, pool_maxsize=1
+        )
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._bootstrap_executor = ThreadPoolExecutor(max_workers=bootstrap_concurrency)
+        self._indexes = {}
+        self._index_locks = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Release the worker threads and every pooled connection. """
+        self._executor.shutdown()
+        self._bootstrap_executor.shutdown()
+        self.session.close()
+        self.bootstrap_session.close()
+
+    async def _request(self, method, url, endpoint=None, node=None, **kwargs):
+        """ Send a request to the Manager from the Manager thread pool, paced by the limiter. """
+        loop = asyncio.get_running_loop()
+
+        def _send(attempt):
+            with tracing.span(
+                f"manager.{method}", node=node, endpoint=endpoint, attempt=attempt
+            ) as span:
+                response = self.session.request(method, url, verify=self.verify, **kwargs)
+                span["status"] = response.status_code
+            return response
+
+        return await loop.run_in_executor(self._executor, paced_request, _send, self.limiter)
+
+    async def list(self, endpoint) -> list:
+        """Every object within a Manager listing, following its pages. Pages are decoded as
+        they stream in, on the Manager thread pool."""
+        loop = asyncio.get_running_loop()
+        objects = []
+        url = f"{self.url}{self.routes[endpoint]}"
+        params = {"limit": self.page_size}
+        while url:
+            response = await self._request(
+                "get", url, endpoint=endpoint, params=params, stream=True
+            )
+            meta = {}
+            with response:
+                if not response.ok:
+                    raise ManagerRequestError(
+                        f"Error: Unable to list '{endpoint}'. "
+                        f"Status code: {response.status_code}."
+                    )
+                page = await loop.run_in_executor(
+                    self._executor, lambda: list(iter_listing(response, meta))
+                )
+            objects.extend(page)
+            next_page = meta.get("next")
+            url = f"{self.url}{next_page}" if next_page else None
+            params = None
+        return objects
+
+    async def index(self, endpoint, key) -> dict:
+        """An index of key -> object over an endpoint's listing. The listing is fetched once,
+        however many coroutines ask for it at the same time."""
+        cache_key = (endpoint, key)
+        lock = self._index_locks.setdefault(cache_key, asyncio.Lock())
+        async with lock:
+            if cache_key not in self._indexes:
+                objects = await self.list(endpoint)
+                self._indexes[cache_key] = {obj.get(key): obj for obj in objects}
+        return self._indexes[cache_key]
+
+    async def lookup(self, endpoint, key, val):
+        """ The object within an endpoint where key == val, or None. """
+        return (await self.index(endpoint, key)).get(val)
+
+    async def _resource_path(self, endpoint, key, val) -> str:
+        obj = await self.lookup(endpoint, key, val)
+        if not obj:
+            raise ConfigurationNotFound(f"No '{endpoint}' found with {key} '{val}'.")
+        return f"{self.routes[endpoint]}{obj['id']}/"
+
+    async def create_node(
+        self,
+        hostname,
+        private_ip,
+        public_ip,
+        netmask,
+        gateway,
+        domain,
+        node_password,
+        system_location_name,
+        tls_certificate_subject_name,
+    ) -> bytes:
+        """Create a node's configuration within the Manager and return the bootstrap XML
+        document generated for it."""
+        # Every parameter is named after the CLI argument it replaces.
+        params = locals()
+        missing = [arg for arg in REQUIRED_CREATE_ARGS if not params[arg]]
+        if missing:
+            raise MissingArgumentError(f"Missing {', '.join(missing)} to create {hostname}.")
+        if await self.lookup("node", "name", hostname):
+            raise TranscoderAlreadyExists(f"Transcoder Node {hostname} already exists.")
+
+        tls_certificate, system_location = await asyncio.gather(
+            self._resource_path("tls_cert", "subject_name", tls_certificate_subject_name),
+            self._resource_path("system_location", "name", system_location_name),
+        )
+        data = {
+            "name": hostname,
+            "hostname": hostname,
+            "domain": domain,
+            "address": private_ip,
+            "static_nat_address": public_ip,
+            "netmask": netmask,
+            "gateway": gateway,
+            "password": node_password,
+            "tls_certificate": tls_certificate,
+            "system_location": system_location,
+        }
+        response = await self._request(
+            "post",
+            f"{self.url}{self.routes['node']}",
+            endpoint="node",
+            node=hostname,
+            data=json.dumps({**data, **DEFAULT_CREATE_DATA}),
+        )
+        if not response.ok:
+            raise NodeCreationError(
+                f"Manager rejected configuration for {hostname}. "
+                f"Status code: {response.status_code}."
+            )
+        # The Manager answers with the new object's URI, e.g. '.../worker_vm/12/'.
+        location = response.headers.get("Location", "").rstrip("/")
+        if location.rpartition("/")[2].isdigit():
+            data["id"] = int(location.rpartition("/")[2])
+        (await self.index("node", "name"))[hostname] = data
+        return response.content
+
+    async def bootstrap(self, hostname, address, content):
+        """Bootstrap a node with its XML, polling its bootstrap port until it is reachable and
+        accepts the configuration. Returns the bootstrap response, or raises
+        ProvisioningError once 'bootstrap_deadline' seconds have passed."""
+        loop = asyncio.get_running_loop()
+        url = self.bootstrap_url.format(address=address, port=self.bootstrap_port)
+        deadline = time.time() + self.bootstrap_deadline
+        trace_start = time.perf_counter()
+        attempts = 0
+        while True:
+            reachable = await loop.run_in_executor(
+                self._bootstrap_executor, is_reachable, address, self.bootstrap_port
+            )
+            if not reachable:
+                error = f"Port {self.bootstrap_port} is not reachable yet."
+            else:
+                attempts += 1
+                if attempts > 1:
+                    metrics.retried(url)
+                try:
+                    response = await loop.run_in_executor(
+                        self._bootstrap_executor, self._post_bootstrap, url, content
+                    )
+                except requests.exceptions.RequestException as e:
+                    error = e
+                else:
+                    if response.ok:
+                        tracing.record(
+                            "bootstrap.node", trace_start, time.perf_counter(), node=hostname
+                        )
+                        return response
+                    if response.status_code not in BOOTSTRAP_RETRY_STATUSES:
+                        raise ProvisioningError(
+                            f"Error in response returned when provisioning node {hostname}. "
+                            f"Status code: {response.status_code}."
+                        )
+                    error = f"Status code: {response.status_code}"
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise ProvisioningError(
+                    f"Unable to bootstrap node {hostname} at {address} within "
+                    f"{self.bootstrap_deadline}s after {attempts} attempts. Last error: {error}"
+                )
+            metrics.inc("pexip_bootstrap_retries")
+            delay = self.bootstrap_poll_interval * random.uniform(0.5, 1.5)
+            await asyncio.sleep(min(delay, remaining))
+
+    def _post_bootstrap(self, url, content):
+        with open_body(content) as body:
+            return self.bootstrap_session.post(
+                url, verify=False, headers={"Content-Type": "text/xml"}, data=body, timeout=5
+            )
+
+    async def provision_node(self, hostname, private_ip, **node):
+        """Create a node's configuration and bootstrap it at 'private_ip'. Returns the
+        bootstrap XML, which the caller may keep to retry a failed bootstrap."""
+        content = await self.create_node(hostname, private_ip, **node)
+        await self.bootstrap(hostname, private_ip, content)
+        return content
+
+    async def delete_node(self, hostname, check_active_calls=False):
+        """Delete a node's configuration from the Manager. With 'check_active_calls', a node
+        currently hosting participants raises TranscoderInUse instead."""
+        node = await self.lookup("node", "name", hostname)
+        if node and "id" not in node:
+            # Created through this client without its URI, fetch the listing again.
+            self._indexes.pop(("node", "name"), None)
+            node = await self.lookup("node", "name", hostname)
+        if not node:
+            raise TranscoderNotFound(f"Transcoder Node {hostname} does not exist.")
+        if check_active_calls:
+            participants = await self.list("participant")
+            if any(p.get("node") == node.get("address") for p in participants):
+                raise TranscoderInUse(f"Transcoder Node {hostname} is hosting active calls.")
+
+        url = f"{self.url}{self.routes['node']}{node['id']}/"
+        response = await self._request("delete", url, endpoint="node", node=hostname)
+        if not response.ok:
+            raise NodeDeletionError(
+                f"Manager refused to delete {hostname}. Status code: {response.status_code}."
+            )
+        (await self.index("node", "name")).pop(hostname, None)
@@ -0,0 +1,129 @@
+import json
+import time
+import threading
+
+from pathlib import Path
+from urllib.parse import urlparse
+
+from .config import get_default_data_dir
+
+
+def get_default_cache_dir() -> Path:
+    """ Cache listings next to the Pexip config, falling back to the users home directory. """
+    return get_default_data_dir() / "cache"
+
+
+class LookupCache:
+    """A per-run cache of Manager listings, shared by every node within a batch.
+
+    Each listing is fetched once and indexed by a key (e.g. 'name' or 'subject_name'),
+    so that repeated lookups are a single dictionary access. When a 'ttl' is set,
+    listings are also persisted to 'cache_dir' and reused by later runs until they expire.
+    Listings within a 'snapshot' (see 'pexip snapshot') are used without asking the Manager,
+    but only for the Manager the snapshot was taken of.
+    """
+
+    def __init__(self, ttl=0, cache_dir=None, snapshot=None):
+        self.ttl = ttl
+        self.snapshot = snapshot
+        self.cache_dir = Path(cache_dir) if cache_dir else get_default_cache_dir()
+        self._indexes = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._mismatched = set()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _cache_path(self, url, endpoint) -> Path:
+        return self.cache_dir / f"{urlparse(url).netloc or 'manager'}_{endpoint}.json"
+
+    def _read_disk(self, url, endpoint):
+        """ Return the objects cached on disk for an endpoint, or None if missing or expired. """
+        if not self.ttl:
+            return None
+        try:
+            with self._cache_path(url, endpoint).open("rt") as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if time.time() - data.get("fetched_at", 0) > self.ttl:
+            return None
+        return data.get("objects")
+
+    def _write_disk(self, url, endpoint, objects):
+        if not self.ttl:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with self._cache_path(url, endpoint).open("wt") as f:
+                json.dump({"fetched_at": time.time(), "objects": objects}, f)
+        except IOError as e:
+            print(f"Warning: Unable to write lookup cache to {self.cache_dir}. Error: {e}")
+
+    def _from_snapshot(self, url, endpoint):
+        """ Return the snapshot's objects for an endpoint, if it was taken of this Manager. """
+        if self.snapshot is None:
+            return None
+        if (self.snapshot.manager_url or "").rstrip("/") != url.rstrip("/"):
+            with self._lock:
+                warn = url not in self._mismatched
+                self._mismatched.add(url)
+            if warn:
+                print(
+                    f"Warning: The snapshot was taken of {self.snapshot.manager_url}, not {url}. "
+                    "Listing the Manager instead."
+                )
+            return None
+        return self.snapshot.objects.get(endpoint)
+
+    def index(self, client, endpoint, key) -> dict:
+        """ Return the listing of an endpoint indexed by 'key', fetching it at most once. """
+        cache_key = (client.url, endpoint, key)
+        with self._key_lock(cache_key):
+            if cache_key not in self._indexes:
+                objects = self._from_snapshot(client.url, endpoint)
+                if objects is None:
+                    objects = self._read_disk(client.url, endpoint)
+                if objects is None:
+                    objects = list(client._iter_config(endpoint))
+                    self._write_disk(client.url, endpoint, objects)
+                self._indexes[cache_key] = {obj.get(key): obj for obj in objects}
+            return self._indexes[cache_key]
+
+    def lookup(self, client, endpoint, key, val):
+        """ Find a single object within an endpoint's listing where key == val. """
+        return self.index(client, endpoint, key).get(val)
+
+    def _update(self, client, endpoint, obj, remove=False):
+        """Add (or remove) an object changed during this run in every index of its endpoint,
+        and drop the on-disk copy of the listing as it is now out of date."""
+        with self._lock:
+            indexes = [
+                (cache_key, index)
+                for cache_key, index in self._indexes.items()
+                if cache_key[:2] == (client.url, endpoint)
+            ]
+        for (_, _, key), index in indexes:
+            if remove:
+                index.pop(obj.get(key), None)
+            else:
+                index[obj.get(key)] = obj
+        try:
+            self._cache_path(client.url, endpoint).unlink()
+        except FileNotFoundError:
+            pass
+
+    def add(self, client, endpoint, obj):
+        """ Record an object created during this run. """
+        self._update(client, endpoint, obj)
+
+    def remove(self, client, endpoint, obj):
+        """ Forget an object deleted during this run. """
+        self._update(client, endpoint, obj, remove=True)
+
+    def clear(self):
+        """ Forget every listing, so each is fetched again the next time it is needed. """
+        with self._lock:
+            self._indexes = {}
@@ -1,12 +1,22 @@
 import sys
+import copy
 import json
 import argparse
 
 from textwrap import dedent
 from argparse import RawDescriptionHelpFormatter
+from collections.abc import Iterator
 
-from ..models import DataObject
+from ..data import NodeSpec
 from ..config import Config
+from ..exceptions import InventoryError
+from ..inventory import read_inventory
+
+# Actions which may run against several Managers at once.
+MULTI_MANAGER_ACTIONS = ["create", "delete", "plan", "apply", "status"]
+
+# Actions which need a 'hostname' or an '--inventory' of nodes to target.
+TARGETED_ACTIONS = ["delete", "plan", "apply"]
 
 
 class PexipHelpFormatter(RawDescriptionHelpFormatter):
@@ -44,16 +54,27 @@ class PexipArgumentParser(argparse.ArgumentParser):
     def parse_args(self, args=None, namespace=None) -> argparse.Namespace:
 
         self.args = super().parse_args(args, namespace)
+        self.hostname = None
         try:
             self.action = self.args.subparser
         except AttributeError:
             super().print_help()
             sys.exit()
 
+        config_files = self.args.config_file or [Config.default_filename]
+        if len(config_files) > 1:
+            self._split_out_hostname()
+            self._check_targets()
+            self._split_managers(config_files)
+            return (self.data, self.action)
+
+        self.args.config_file = config_files[0]
         self.cfg = Config(self.args.config_file)
 
         self._apply_config_values()
+        self._check_resume()
         self._split_out_hostname()
+        self._check_targets()
         self._remerge_data()
 
         return (self.data, self.action)
@@ -72,12 +93,30 @@ class PexipArgumentParser(argparse.ArgumentParser):
                 # During 'bootstrap' subcommand, certain attributes aren't always present
                 pass
 
+    def _check_resume(self):
+        if getattr(self.args, "resume", False) and not self.args.journal:
+            self.error("argument --resume: requires argument --journal")
+
+    def _check_targets(self):
+        if self.action in TARGETED_ACTIONS and self.hostname is None:
+            self.error(f"'{self.action}' requires a hostname or --inventory")
+
     def _split_out_hostname(self):
         """ Attempt to parse hostname positional argument as JSON blob """
+        inventory = getattr(self.args, "inventory", None)
+        if inventory:
+            if self.args.hostname:
+                self.error("argument hostname: not allowed with argument --inventory")
+            # Stream node records from the inventory file (or stdin) as they are read.
+            self.hostname = read_inventory(inventory)
+            del self.args.hostname
+            return
+
         try:
             # Attempt load the 'hostname' argument up as a JSON dictionary
             self.hostname = json.loads(self.args.hostname)
-        except json.decoder.JSONDecodeError:
+        except (json.decoder.JSONDecodeError, TypeError):
+            # Not JSON, or no hostname passed at all
             self.hostname = self.args.hostname
         except AttributeError:
             # No args.hostname supplied, nothing to do.
@@ -87,10 +126,72 @@ class PexipArgumentParser(argparse.ArgumentParser):
             del self.args.hostname
 
     def _remerge_data(self):
-        """ Merge in global argument data with every hostname object """
+        """ Layer every hostname object over the global argument data """
         if isinstance(self.hostname, list):
-            # Create a list of DataObjects merged in with top level config values
-            # NOTE: the 2nd merged value will win in the event of a key conflict.
-            self.data = [DataObject({**vars(self.args), **hostname}) for hostname in self.hostname]
+            # Create a list of NodeSpecs layered over the top level config values
+            # NOTE: values set for the node itself win over the global arguments.
+            self.data = [self._merge(hostname) for hostname in self.hostname]
+        elif isinstance(self.hostname, Iterator):
+            # Lazily merge records streamed from an inventory.
+            self.data = (self._merge(hostname) for hostname in self.hostname)
         else:
             self.data = self.args
+
+    def _merge(self, hostname) -> NodeSpec:
+        """Layer a single hostname object, or plain hostname, over the global arguments.
+        The arguments are shared by every node rather than copied into each one."""
+        if isinstance(hostname, str):
+            hostname = {"hostname": hostname}
+        return NodeSpec(self.args, **hostname)
+
+    def _split_managers(self, config_files):
+        """Build one set of arguments per Manager config file, and hand each Manager the
+        nodes naming it. 'data' becomes a dictionary of Manager name -> that Manager's data,
+        the same shape as for a single Manager."""
+        if self.action not in MULTI_MANAGER_ACTIONS:
+            self.error(f"argument --config-file: '{self.action}' takes a single config file")
+        if isinstance(self.hostname, str):
+            self.error(
+                "argument hostname: name the Manager of every node, with a JSON list of "
+                "nodes or an --inventory, when running against several Managers"
+            )
+
+        cli_args = self.args
+        managers = {}
+        for filename in config_files:
+            self.args = copy.copy(cli_args)
+            self.args.config_file = filename
+            self.cfg = Config(filename)
+            self._apply_config_values()
+            self._check_resume()
+            name = self.cfg.manager_name
+            if name in managers:
+                self.error(f"argument --config-file: '{filename}' was given more than once")
+            if getattr(self.args, "journal", None):
+                # Every Manager's run keeps its own journal.
+                self.args.journal = f"{self.args.journal}.{name}"
+            managers[name] = self.args
+        self.args = cli_args
+
+        if self.hostname is None:
+            self.data = managers
+            return
+
+        aliases = {}
+        for name, args in managers.items():
+            aliases[name] = aliases[args.config_file] = name
+            if args.manager_url:
+                aliases[args.manager_url.rstrip("/")] = name
+        nodes = {name: [] for name in managers}
+        try:
+            for position, record in enumerate(self.hostname, 1):
+                if isinstance(record, str):
+                    record = {"hostname": record}
+                manager = record.get("manager") or (record.get("manager_url") or "").rstrip("/")
+                if manager not in aliases:
+                    hostname = record.get("hostname") or f"node #{position}"
+                    self.error(f"{hostname}: unknown or missing Manager {manager!r}")
+                nodes[aliases[manager]].append(NodeSpec(managers[aliases[manager]], **record))
+        except InventoryError as e:
+            self.error(f"argument --inventory: {e}")
+        self.data = {name: nodes[name] for name in managers if nodes[name]}
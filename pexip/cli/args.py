@@ -4,6 +4,17 @@ import sys
 from argparse import FileType, OPTIONAL, SUPPRESS, ZERO_OR_MORE
 
 from .argparser import PexipArgumentParser
+from ..definitions import (
+    DEFAULT_BOOTSTRAP_DEADLINE,
+    DEFAULT_BOOTSTRAP_PARALLEL,
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_SERVE_CACHE_REFRESH,
+    DEFAULT_SERVE_HOST,
+    DEFAULT_SERVE_PARALLEL,
+    DEFAULT_SNAPSHOT_PARALLEL,
+    LOOKUP_MODES,
+)
+from ..tracing import TRACE_FORMATS, TRACE_JSON
 
 from textwrap import dedent
 
@@ -30,9 +41,13 @@ global_options.add_argument(
 )
 global_options.add_argument(
     "--config-file",
-    default="config.json",
+    action="append",
     help="""
     Name of the JSON configuration file within the .pexip/ directory. E.g. 'prod.config.json'
+    Repeat it to run against several Managers at once, each with its own connections, cache
+    and limits. Nodes then name their Manager with a 'manager' field (the config file name,
+    without '.config.json', or its manager_url), or are read from an inventory keyed by
+    Manager. Default: config.json
     """,
 )
 global_options.add_argument(
@@ -43,57 +58,271 @@ global_options.add_argument(
     """,
 )
 
-###
-# Create
-###
-provision_create = subparsers.add_parser("create")
-provision_create.set_defaults(subparser="create")
+global_options.add_argument(
+    "--page-size",
+    type=int,
+    default=DEFAULT_PAGE_SIZE,
+    help=f"""
+    Number of objects to request per page when listing Manager configuration. Larger pages
+    mean fewer requests, smaller pages use less memory. Default: {DEFAULT_PAGE_SIZE}""",
+)
+global_options.add_argument(
+    "--lookup",
+    choices=LOOKUP_MODES,
+    help="""
+    How to find existing nodes, TLS certificates and system locations within the Manager.
+    'filter' sends one small filtered query per lookup, 'listing' fetches each listing once
+    and shares it across the run. Default: 'listing' for batches, otherwise 'filter'""",
+)
+global_options.add_argument(
+    "--cache-ttl",
+    type=int,
+    default=0,
+    help="""
+    Number of seconds to reuse Manager listings (TLS certificates, system locations and
+    nodes) cached on disk by a previous run. Default: 0 (disabled)""",
+)
+global_options.add_argument(
+    "--cache-dir",
+    help="""
+    Directory to store cached Manager listings in. Default: <config dir>/cache""",
+)
 
-provision_create.add_argument(
-    "--domain",
-    help="The domain of the new node.",
+global_options.add_argument(
+    "--snapshot",
+    help="""
+    Answer lookups from a file written by 'pexip snapshot' instead of the Pexip Manager,
+    e.g. to 'plan' offline.""",
 )
-provision_create.add_argument(
-    "--private-ip",
-    help="The private IP address of the Pexip node to provision.",
+
+global_options.add_argument(
+    "--server",
+    default=os.environ.get("PEXIP_SERVER"),
+    help="""
+    Forward create, delete and bootstrap to the 'pexip serve' daemon at this address,
+    'unix:<socket path>' or 'http://<host>:<port>', which keeps its Manager sessions and
+    lookups warm between commands. Runs locally if no daemon is listening.
+    Default: env['PEXIP_SERVER']""",
 )
-provision_create.add_argument(
-    "--public-ip",
-    help="The public IP address of the Pexip node to provision.",
+
+global_options.add_argument(
+    "--pool-size",
+    type=int,
+    help="""
+    Number of keep-alive connections to hold open to the Pexip Manager, shared by every
+    node within the run. Default: the larger of --parallel and 10""",
 )
-provision_create.add_argument(
-    "--netmask",
-    default="255.255.255.0",
-    help="The IP netmask of the new node. Default: '255.255.255.0'",
+
+global_options.add_argument(
+    "--manager-rate",
+    type=float,
+    help="""
+    Maximum requests per second sent to the Pexip Manager, with bursts of up to
+    --manager-burst. Set it per Manager with MANAGER_RATE in its config file.
+    Default: unlimited""",
 )
-provision_create.add_argument(
-    "--gateway",
-    help="The Gateway IP for new node.",
+global_options.add_argument(
+    "--manager-burst",
+    type=int,
+    help="""
+    Number of requests that may be sent at once, within --manager-rate. Default: 20""",
 )
+global_options.add_argument(
+    "--manager-concurrency",
+    type=int,
+    help="""
+    Upper bound of the requests in flight to the Pexip Manager. The bound adapts to the
+    Manager: halved on errors or slow responses, grown back while it is healthy.
+    Default: --pool-size""",
+)
+
+global_options.add_argument(
+    "--spool-dir",
+    help="""
+    Directory holding the bootstrap payloads of nodes that failed to provision, to be
+    retried with 'pexip bootstrap --spool'. Default: <config dir>/spool""",
+)
+
+global_options.add_argument(
+    "--trace",
+    help="""
+    Record how long each node spent in every phase (Manager lookups, worker_vm creation,
+    waiting on port 8443, bootstrap attempts) and write the spans to this file.""",
+)
+global_options.add_argument(
+    "--trace-format",
+    choices=TRACE_FORMATS,
+    default=TRACE_JSON,
+    help="""
+    Format of the --trace file. 'chrome' can be opened with chrome://tracing or Perfetto.
+    Default: 'json'""",
+)
+global_options.add_argument(
+    "--metrics",
+    help="""
+    Write request counts and latencies (by route and status), retry counts and per-node
+    provisioning times to this file at the end of the run, in the OpenMetrics text format.
+    Point it into node_exporter's textfile collector directory to scrape them.""",
+)
+global_options.add_argument(
+    "--profile",
+    help="""
+    Directory to write cProfile statistics (pexip.prof, of the main and every worker thread)
+    and tracemalloc allocation statistics (tracemalloc.txt) for the run to.""",
+)
+
+###
+# Create
+###
+provision_create = subparsers.add_parser("create")
+provision_create.set_defaults(subparser="create")
+
 provision_create.add_argument(
-    "--node-password",
-    default=os.environ.get("PEXIP_TRANSCODER_PASSWORD", "SuperSecr3t!"),
-    help="The password to use for the new Transcoder node.",
+    "--journal",
+    help="""
+    Record the phases each node completes (validated, configuration created, bootstrap XML
+    received, bootstrapped) to this file, so that an interrupted run can be resumed.""",
 )
 provision_create.add_argument(
-    "--tls-certificate-subject-name",
+    "--resume",
+    action="store_true",
     help="""
-    Subject name of the TLS Certificate to apply to the node.""",
+    Continue the run recorded in --journal. Bootstrapped nodes are skipped and nodes
+    whose bootstrap XML was received are bootstrapped from it, without calling the Manager.""",
 )
 
+###
+# Plan / Apply
+###
+provision_plan = subparsers.add_parser("plan")
+provision_plan.set_defaults(subparser="plan")
+
+provision_apply = subparsers.add_parser("apply")
+provision_apply.set_defaults(subparser="apply")
+
+for subparser in [provision_plan, provision_apply]:
+    subparser.add_argument(
+        "--prune",
+        action="store_true",
+        help="""
+        Also delete nodes found within the Manager that are not part of the desired set.
+        Only nodes in the same system locations as the desired nodes are considered.""",
+    )
+
+###
+# Common Create / Plan / Apply Arguments
+###
+
+for subparser in [provision_create, provision_plan, provision_apply]:
+    subparser.add_argument(
+        "--no-preflight",
+        action="store_true",
+        help="""
+        Skip validating the whole batch before contacting the Manager (missing fields,
+        duplicate hostnames, colliding addresses, gateways outside the subnet). Nodes of
+        an --inventory are then created as they are read.""",
+    )
+    subparser.add_argument(
+        "--domain",
+        help="The domain of the new node.",
+    )
+    subparser.add_argument(
+        "--private-ip",
+        help="The private IP address of the Pexip node to provision.",
+    )
+    subparser.add_argument(
+        "--public-ip",
+        help="The public IP address of the Pexip node to provision.",
+    )
+    subparser.add_argument(
+        "--netmask",
+        default="255.255.255.0",
+        help="The IP netmask of the new node. Default: '255.255.255.0'",
+    )
+    subparser.add_argument(
+        "--gateway",
+        help="The Gateway IP for new node.",
+    )
+    subparser.add_argument(
+        "--node-password",
+        default=os.environ.get("PEXIP_TRANSCODER_PASSWORD", "SuperSecr3t!"),
+        help="The password to use for the new Transcoder node.",
+    )
+    subparser.add_argument(
+        "--tls-certificate-subject-name",
+        help="""
+        Subject name of the TLS Certificate to apply to the node.""",
+    )
+
+
 ###
 # Delete
 ###
 provision_delete = subparsers.add_parser("delete")
 provision_delete.set_defaults(subparser="delete")
 
+for subparser in [provision_delete, provision_apply]:
+    subparser.add_argument(
+        "--check-active-calls",
+        action="store_true",
+        help="""
+        Leave nodes that are currently hosting participants in place, instead of deleting them.""",
+    )
+
+###
+# Snapshot
+###
+provision_snapshot = subparsers.add_parser("snapshot")
+provision_snapshot.set_defaults(subparser="snapshot")
+
+provision_snapshot.add_argument(
+    "-o",
+    "--output",
+    default="pexip-snapshot.json.gz",
+    help="""
+    File to write the gzip compressed snapshot to. Default: pexip-snapshot.json.gz""",
+)
+provision_snapshot.add_argument(
+    "--parallel",
+    type=int,
+    default=DEFAULT_SNAPSHOT_PARALLEL,
+    help=f"""
+    Number of Manager listings to fetch concurrently. Default: {DEFAULT_SNAPSHOT_PARALLEL}""",
+)
+
 ###
-# Common Create / Delete Arguments
+# Status
 ###
+provision_status = subparsers.add_parser("status")
+provision_status.set_defaults(subparser="status")
 
-for subparser in [provision_create, provision_delete]:
+provision_status.add_argument(
+    "--watch",
+    type=float,
+    metavar="SECONDS",
+    help="""
+    Keep refreshing every SECONDS, printing only the nodes that changed, until every node
+    has settled: reachable and synced for a couple of refreshes. Each refresh only lists
+    the status of nodes updated since the last one (by 'last_updated'), with a full
+    listing every few refreshes or when the Manager cannot filter by it. Settled nodes
+    are no longer probed.""",
+)
+provision_status.add_argument(
+    "--parallel",
+    type=int,
+    default=DEFAULT_BOOTSTRAP_PARALLEL,
+    help=f"""
+    Number of node bootstrap ports to probe concurrently. Default: {DEFAULT_BOOTSTRAP_PARALLEL}""",
+)
+
+###
+# Common Create / Delete / Plan / Apply Arguments
+###
+
+for subparser in [provision_create, provision_delete, provision_plan, provision_apply]:
     subparser.add_argument(
         "hostname",
+        nargs=OPTIONAL,
         help="The hostname of the Pexip node to target.",
     )
     subparser.add_argument(
@@ -104,6 +333,35 @@ for subparser in [provision_create, provision_delete]:
         The deployment environment of the conference node. 
         Default: staging""",
     )
+    subparser.add_argument(
+        "--system-location-name",
+        help="Name of the system location to create or delete conferencing node from.",
+    )
+    subparser.add_argument(
+        "--inventory",
+        type=FileType("r"),
+        help="""
+        Read the nodes to target from a file, or '-' for stdin, instead of 'hostname'.
+        Accepts a JSON array of nodes, NDJSON (one node per line) or the output of
+        'terraform output -json'.""",
+    )
+    subparser.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        help="""
+        Number of nodes to work on concurrently when 'hostname' is a JSON list of nodes,
+        or an --inventory is given. Default: 1""",
+    )
+
+for subparser in [
+    provision_create,
+    provision_delete,
+    provision_plan,
+    provision_apply,
+    provision_snapshot,
+    provision_status,
+]:
     subparser.add_argument(
         "-u",
         "--auth_user",
@@ -120,10 +378,6 @@ for subparser in [provision_create, provision_delete]:
         Password to auhenticate against meet manager with. 
         Default: env['MEETING_MANAGER_PASS']""",
     )
-    subparser.add_argument(
-        "--system-location-name",
-        help="Name of the system location to create or delete conferencing node from.",
-    )
 
 
 ###
@@ -140,3 +394,80 @@ provision_bootstrap.add_argument(
     "--node-address",
     help="The domain name or private IP address of the Pexip node to bootstrap.",
 )
+provision_bootstrap.add_argument(
+    "--spool",
+    action="store_true",
+    help="""
+    Bootstrap every node whose payload is waiting in the spool directory, concurrently,
+    instead of a single --xml-file.""",
+)
+
+###
+# Serve
+###
+provision_serve = subparsers.add_parser("serve")
+provision_serve.set_defaults(subparser="serve")
+
+provision_serve.add_argument(
+    "--socket",
+    help="""
+    Path of the Unix socket to listen on, usable only by the current user. Forward
+    commands to it with '--server unix:<path>'. Default: <config dir>/serve.sock""",
+)
+provision_serve.add_argument(
+    "--port",
+    type=int,
+    help="""
+    Listen on --host:--port instead of a Unix socket. Every request must then carry the
+    daemon's token, written to --token-file, which the CLI reads from there or from
+    env['PEXIP_SERVER_TOKEN'].""",
+)
+provision_serve.add_argument(
+    "--host",
+    default=DEFAULT_SERVE_HOST,
+    help=f"Address to listen on with --port. Default: {DEFAULT_SERVE_HOST}",
+)
+provision_serve.add_argument(
+    "--token-file",
+    help="""
+    File to write the token of a --port daemon to, readable only by the current user.
+    Default: <config dir>/serve.token""",
+)
+provision_serve.add_argument(
+    "--parallel",
+    type=int,
+    default=DEFAULT_SERVE_PARALLEL,
+    help=f"""
+    Number of nodes to create or delete at the same time, across every forwarded command.
+    Default: {DEFAULT_SERVE_PARALLEL}""",
+)
+provision_serve.add_argument(
+    "--cache-refresh",
+    type=int,
+    default=DEFAULT_SERVE_CACHE_REFRESH,
+    help=f"""
+    Seconds to keep reusing Manager listings (TLS certificates, system locations and
+    nodes) before fetching them again. Default: {DEFAULT_SERVE_CACHE_REFRESH}""",
+)
+
+###
+# Common Create / Apply / Bootstrap Arguments
+###
+
+for subparser in [provision_create, provision_apply, provision_bootstrap, provision_serve]:
+    subparser.add_argument(
+        "--bootstrap-parallel",
+        type=int,
+        default=DEFAULT_BOOTSTRAP_PARALLEL,
+        help=f"""
+        Number of nodes to probe or bootstrap at the same time.
+        Default: {DEFAULT_BOOTSTRAP_PARALLEL}""",
+    )
+    subparser.add_argument(
+        "--bootstrap-deadline",
+        type=int,
+        default=DEFAULT_BOOTSTRAP_DEADLINE,
+        help=f"""
+        Seconds to keep waiting for a node to come up and accept its bootstrap
+        configuration before giving up on it. Default: {DEFAULT_BOOTSTRAP_DEADLINE}""",
+    )
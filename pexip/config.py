@@ -2,6 +2,7 @@ import os
 import json
 import errno
 
+from functools import lru_cache
 from pathlib import Path
 from typing import Union
 
@@ -10,9 +11,11 @@ DEFAULT_RELATIVE_CONFIG_HOME = Path(".pexip")
 ENV_PEXIP_CONFIG_DIR = "PEXIP_CONFIG_DIR"
 
 
+@lru_cache(maxsize=None)
 def get_default_config_dir() -> Path:
     """
-    Find the default Pexip config directory.
+    Find the default Pexip config directory. Only searched for once per process,
+    the first time it is needed.
     """
 
     # 1. Grab through Env
@@ -31,7 +34,19 @@ def get_default_config_dir() -> Path:
         return home_config_dir
 
 
-DEFAULT_CONFIG_DIR = get_default_config_dir()
+def get_default_data_dir() -> Path:
+    """
+    The directory to keep the CLI's own files in (lookup cache, spool, daemon socket): the
+    Pexip config directory, or .pexip/ within the users home directory when there isn't one.
+    """
+    return get_default_config_dir() or Path.home() / DEFAULT_RELATIVE_CONFIG_HOME
+
+
+def __getattr__(name):
+    # DEFAULT_CONFIG_DIR is resolved lazily, rather than probing the filesystem at import time.
+    if name == "DEFAULT_CONFIG_DIR":
+        return get_default_config_dir()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class ConfigFileError(Exception):
@@ -50,8 +65,11 @@ class BaseConfigDict(dict):
 
 class Config(BaseConfigDict):
     default_filename = "config.json"
+    # Suffixes removed from a config file name to name the Manager it configures.
+    name_suffixes = (".json", ".config")
 
-    def __init__(self, filename=None, directory=DEFAULT_CONFIG_DIR):
+    def __init__(self, filename=None, directory=None):
+        directory = directory or get_default_config_dir()
         # if a directory isn't found, just return
         if not directory:
             return
@@ -71,3 +89,12 @@ class Config(BaseConfigDict):
             data = {}
 
         self.update(data)
+
+    @property
+    def manager_name(self) -> str:
+        """ A short name for the Manager, from the file name. E.g. 'prod.config.json' -> 'prod' """
+        name = self.filename if hasattr(self, "filename") else self.default_filename
+        for suffix in self.name_suffixes:
+            if name.endswith(suffix):
+                name = name[: -len(suffix)]
+        return name
@@ -0,0 +1,110 @@
+import threading
+
+from .cache import LookupCache
+from .journal import Journal
+from .limiter import ManagerLimiter, limiter_options
+from .definitions import (
+    DEFAULT_BOOTSTRAP_PARALLEL,
+    DEFAULT_POOL_MAXSIZE,
+    LOOKUP_FILTER,
+    LOOKUP_LISTING,
+)
+
+
+class RunContext:
+    """State shared by every node within a single run of the CLI.
+
+    Holds the lookup cache, the run's Journal (if any) and the keep-alive connection pools:
+    one pool for every call to the Manager, and a separate one for bootstrap traffic to the
+    nodes themselves. Requests to each Manager are paced by its own ManagerLimiter, built
+    from 'limiter_options'.
+    Sessions are created on first use and are safe to share between worker threads.
+    """
+
+    def __init__(
+        self,
+        cache=None,
+        lookup=LOOKUP_LISTING,
+        pool_size=DEFAULT_POOL_MAXSIZE,
+        bootstrap_pool_size=DEFAULT_BOOTSTRAP_PARALLEL,
+        journal=None,
+        limiter_options=None,
+    ):
+        self.cache = cache or LookupCache()
+        self.journal = journal
+        self.limiter_options = limiter_options or {"max_concurrency": pool_size}
+        self._limiters = {}
+        self.lookup = lookup
+        self.pool_size = pool_size
+        self.bootstrap_pool_size = bootstrap_pool_size
+        self._sessions = {}
+        self._bootstrap_session = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, args, batch=False):
+        """Build a RunContext from the global CLI arguments. Unless '--lookup' is given,
+        batches (or runs with an on-disk cache) share full listings, while a single node
+        uses server side filtered queries. A '--snapshot' always answers from its listings."""
+        snapshot = None
+        if getattr(args, "snapshot", None):
+            from .snapshot import Snapshot
+
+            snapshot = Snapshot.read(args.snapshot)
+        lookup = args.lookup
+        if not lookup:
+            lookup = LOOKUP_LISTING if batch or args.cache_ttl or snapshot else LOOKUP_FILTER
+        # Size the Manager pool to the number of workers talking to it, unless set.
+        parallel = getattr(args, "parallel", None) or 1
+        pool_size = args.pool_size or max(parallel, DEFAULT_POOL_MAXSIZE)
+        return cls(
+            cache=LookupCache(
+                ttl=args.cache_ttl or 0, cache_dir=args.cache_dir, snapshot=snapshot
+            ),
+            lookup=lookup,
+            pool_size=pool_size,
+            bootstrap_pool_size=(
+                getattr(args, "bootstrap_parallel", None) or DEFAULT_BOOTSTRAP_PARALLEL
+            ),
+            journal=Journal.from_args(args),
+            limiter_options=limiter_options(args, max_concurrency=pool_size),
+        )
+
+    def manager_session(self, auth):
+        """ The keep-alive session used for every Manager call made with 'auth'. """
+        from .utils import pooled_session
+
+        with self._lock:
+            if auth not in self._sessions:
+                session = pooled_session(pool_connections=1, pool_maxsize=self.pool_size)
+                session.auth = auth
+                self._sessions[auth] = session
+            return self._sessions[auth]
+
+    def limiter(self, url):
+        """ The ManagerLimiter pacing every request sent to the Manager at 'url'. """
+        with self._lock:
+            if url not in self._limiters:
+                self._limiters[url] = ManagerLimiter(**self.limiter_options)
+            return self._limiters[url]
+
+    def bootstrap_session(self):
+        """The keep-alive session used for bootstrap traffic. Every node is a different host,
+        so keep a small pool for each of up to 'bootstrap_pool_size' nodes at once."""
+        from .utils import pooled_session
+
+        with self._lock:
+            if self._bootstrap_session is None:
+                self._bootstrap_session = pooled_session(
+                    pool_connections=self.bootstrap_pool_size, pool_maxsize=1
+                )
+            return self._bootstrap_session
+
+    def close(self):
+        """ Close every pooled connection. """
+        with self._lock:
+            sessions = list(self._sessions.values()) + [self._bootstrap_session]
+            self._sessions, self._bootstrap_session = {}, None
+        for session in sessions:
+            if session is not None:
+                session.close()
@@ -1,38 +1,605 @@
 import os
 import sys
 import json
+import time
+import threading
 import configparser
 
+from collections.abc import Iterator
+from contextlib import contextmanager
+from itertools import chain
+
+from . import metrics, tracing
 from .config import Config
-from .models import DataObject, PexipNode, provision
-from .exceptions import TranscoderAlreadyExists
+from .context import RunContext
+from .exceptions import (
+    InventoryError,
+    ManagerRequestError,
+    ProvisioningError,
+    TranscoderAlreadyExists,
+    TranscoderInUse,
+    TranscoderNotFound,
+)
+
+# NOTE: Modules which import 'requests' (models, provision, reconcile, utils) are imported
+# within the functions that need them, keeping CLI startup and '--help' fast.
+
+# Outcomes reported by 'create_node'
+CREATED = "created"
+EXISTS = "exists"
+FAILED = "failed"
+PROVISIONING = "provisioning"
+COMPLETED = "completed"
+
+# Outcome of a bootstrap forwarded to 'pexip serve'
+BOOTSTRAPPED = "bootstrapped"
+
+# Outcomes reported by 'delete_node'
+DELETED = "deleted"
+NOT_FOUND = "not_found"
+IN_USE = "in_use"
+
+CREATE_LABELS = {
+    CREATED: "created",
+    EXISTS: "already existed",
+    COMPLETED: "completed by a previous run",
+    FAILED: "failed",
+}
+DELETE_LABELS = {
+    DELETED: "deleted",
+    NOT_FOUND: "not found",
+    IN_USE: "skipped with active calls",
+    FAILED: "failed",
+}
+APPLY_LABELS = {**CREATE_LABELS, **DELETE_LABELS}
+BOOTSTRAP_LABELS = {BOOTSTRAPPED: "bootstrapped", FAILED: "failed"}
+
+
+class BatchFailed(SystemExit):
+    """ Exits with status 1 once a batch has finished with failures, carrying its results. """
+
+    def __init__(self, results):
+        super().__init__(1)
+        self.results = results
+
+
+def create_node(transcoder, context=None, pipeline=None):
+    """Create and provision a single node. Errors are isolated to this node and reported
+    back as an outcome so that one failure does not abort the rest of a batch.
+    When a 'pipeline' is passed, the node is handed over to it once configured and the
+    outcome is PROVISIONING along with a Future for its bootstrap."""
+    from .models import PexipNode
+
+    start = time.perf_counter()
 
+    def _provisioned(outcome):
+        metrics.observe(
+            "pexip_node_provisioning_seconds", time.perf_counter() - start, outcome=outcome
+        )
 
-def create_node(transcoder):
-    node = PexipNode(transcoder)
+    node = PexipNode(transcoder, context=context)
+    if context and context.journal and context.journal.resume:
+        resumed = _resume_node(node, context.journal, pipeline)
+        if resumed:
+            return resumed
     try:
-        node.create()
+        if pipeline is None:
+            with tracing.span("node.create", node=transcoder.hostname):
+                node.create()
+        else:
+            with tracing.span("node.configure", node=transcoder.hostname):
+                content = node.configure()
+            bootstrap = node.provision(content, pipeline)
+            bootstrap.add_done_callback(
+                lambda future: _provisioned(FAILED if future.exception() else CREATED)
+            )
+            return (PROVISIONING, bootstrap)
     except TranscoderAlreadyExists as msg:
         print(msg)
+        return (EXISTS, None)
+    except Exception as e:
+        print(f"Error: Failed to create node {transcoder.hostname}. {e}")
+        _provisioned(FAILED)
+        return (FAILED, e)
+    _provisioned(CREATED)
+    return (CREATED, None)
+
+
+def _resume_node(node, journal, pipeline=None):
+    """Continue a node from the last phase 'journal' recorded for it, without calling the
+    Manager. Returns its outcome, or None when it has to be created from the start."""
+    from .journal import BOOTSTRAPPED, CREATED as CONFIG_CREATED, XML_RECEIVED
+
+    hostname = node.args.hostname
+    phase = journal.last_phase(hostname)
+    if phase == BOOTSTRAPPED:
+        print(f"Skipping {hostname}, it was created and bootstrapped by a previous run.")
+        return (COMPLETED, None)
+    if phase == XML_RECEIVED:
+        print(f"Resuming {hostname} from its journaled bootstrap configuration.")
+        content = journal.payload(hostname)
+        if pipeline is not None:
+            return (PROVISIONING, node.provision(content, pipeline))
+        try:
+            node._provision(content)
+        except Exception as e:
+            print(f"Error: Failed to create node {hostname}. {e}")
+            return (FAILED, e)
+        return (CREATED, None)
+    if phase == CONFIG_CREATED:
+        # The Manager only returns the bootstrap XML once, on creation.
+        error = ProvisioningError(
+            f"The configuration of {hostname} was created, but its bootstrap XML was never "
+            "received. Delete the node and create it again."
+        )
+        print(f"Error: Failed to resume node {hostname}. {error}")
+        return (FAILED, error)
+    return None
+
+
+def _print_summary(results, labels=CREATE_LABELS):
+    """ Print an aggregated summary of a batch, using 'labels' to describe each outcome. """
+    outcomes = {outcome: [] for outcome in labels}
+    for hostname, (outcome, _) in results.items():
+        outcomes[outcome].append(hostname)
+
+    counts = ", ".join(f"{len(outcomes[outcome])} {label}" for outcome, label in labels.items())
+    print(f"Summary: {counts}.")
+    for hostname in sorted(outcomes[FAILED]):
+        print(f"  Failed: {hostname}: {results[hostname][1]}")
+
+
+def _split_batch(args):
+    """Return the record to read global options from, and an iterable of every record.
+    'args' is either a single record or a list (or stream) of records."""
+    if not isinstance(args, (list, Iterator)):
+        return args, [args]
+    records = iter(args)
+    first = next(records, None)
+    return first, chain([first], records) if first is not None else []
+
+
+def _preflight(first, nodes) -> list:
+    """Validate every node of a batch offline, before any Manager call, and exit on problems.
+    Returns the nodes as a list, as the whole batch has to be read to validate it."""
+    from .preflight import preflight, print_problems
+
+    if first.no_preflight:
+        return nodes
+    nodes = list(nodes)
+    with tracing.span("preflight"):
+        problems = preflight(nodes)
+    if problems:
+        print_problems(problems)
+        sys.exit(1)
+    return nodes
+
+
+def create_batch(transcoders, parallel=1, context=None, pipeline=None):
+    """Create many nodes using a bounded pool of 'parallel' workers, all sharing one
+    RunContext. Configured nodes are bootstrapped concurrently by 'pipeline', so a slow
+    booting node never holds up the Manager work of the rest of the batch.
+    Returns a dictionary of hostname -> (outcome, error)."""
+    from concurrent.futures import ThreadPoolExecutor
+    from .provision import BootstrapPipeline
+    from .utils import bounded_submit
+
+    context = context or RunContext()
+    pipeline = pipeline or BootstrapPipeline(session=context.bootstrap_session())
+    results = {}
+    parallel = max(1, parallel)
+    with pipeline, ThreadPoolExecutor(max_workers=parallel) as executor:
+        # Keep a few nodes queued per worker, so a streamed inventory is read as it's needed.
+        completed = bounded_submit(
+            executor, create_node, transcoders, parallel * 2, context, pipeline
+        )
+        for transcoder, future in completed:
+            results[transcoder.hostname] = future.result()
+
+    # Closing the pipeline waited for every bootstrap to finish.
+    for hostname, (outcome, bootstrap) in results.items():
+        if outcome == PROVISIONING:
+            error = bootstrap.exception()
+            results[hostname] = (FAILED, error) if error else (CREATED, None)
+    return results
 
 
 def create(args):
     """ Route Pexip Transcoder creation. """
-    if isinstance(args, list):
-        for arg in args:
-            create_node(arg)
+    from .provision import BootstrapPipeline
+
+    if isinstance(args, (list, Iterator)):
+        # Global options are shared by every node, so read them from the first one.
+        first, transcoders = _split_batch(args)
+        if first is None:
+            return
+        transcoders = _preflight(first, transcoders)
+        context = RunContext.from_args(first, batch=True)
+        results = create_batch(
+            transcoders,
+            parallel=first.parallel or 1,
+            context=context,
+            pipeline=BootstrapPipeline.from_args(first, context=context),
+        )
+        context.close()
+        _print_summary(results)
     else:
-        create_node(args)
+        _preflight(args, [args])
+        context = RunContext.from_args(args)
+        results = {args.hostname: create_node(args, context)}
+        context.close()
+
+    if any(outcome == FAILED for outcome, _ in results.values()):
+        raise BatchFailed(results)
+    return results
+
+
+def delete_node(transcoder, context=None, index=None, active_nodes=None):
+    """Delete a single node, resolving it through 'index' (hostname -> worker_vm object) when
+    passed. Errors are isolated to this node and reported back as an outcome."""
+    from .models import PexipNode
+
+    node = PexipNode(transcoder, context=context)
+    try:
+        with tracing.span("node.delete", node=transcoder.hostname):
+            node.delete((index or {}).get(transcoder.hostname), active_nodes=active_nodes)
+    except TranscoderNotFound as msg:
+        print(msg)
+        return (NOT_FOUND, None)
+    except TranscoderInUse as msg:
+        print(msg)
+        return (IN_USE, None)
+    except Exception as e:
+        print(f"Error: Failed to delete node {transcoder.hostname}. {e}")
+        return (FAILED, e)
+    return (DELETED, None)
+
+
+def _active_nodes(client):
+    """ The addresses of every node currently hosting a participant, from one listing pass. """
+    return {participant.get("node") for participant in client._iter_config("participant")}
+
+
+def delete_batch(transcoders, client, parallel=1, context=None, check_active_calls=False):
+    """Delete many nodes. Every hostname is resolved from a single pass over the 'worker_vm'
+    listing, then the DELETE calls are sent by a bounded pool of 'parallel' workers.
+    Returns a dictionary of hostname -> (outcome, error)."""
+    from concurrent.futures import ThreadPoolExecutor
+    from .utils import bounded_submit
+
+    context = context or client.context or RunContext()
+    index = context.cache.index(client, "node", "name")
+    active_nodes = _active_nodes(client) if check_active_calls else None
+
+    results = {}
+    parallel = max(1, parallel)
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        completed = bounded_submit(
+            executor, delete_node, transcoders, parallel * 2, context, index, active_nodes
+        )
+        for transcoder, future in completed:
+            results[transcoder.hostname] = future.result()
+    return results
 
 
 def delete(args):
-    print("TODO: Implement Delete!")
-    sys.exit()
+    """ Route Pexip Transcoder deletion. """
+    from requests import RequestException
+    from .models import PexipClient
+
+    first, transcoders = _split_batch(args)
+    if first is None:
+        return
+    context = RunContext.from_args(first, batch=True)
+    try:
+        results = delete_batch(
+            transcoders,
+            PexipClient(first, context=context),
+            parallel=first.parallel or 1,
+            context=context,
+            check_active_calls=first.check_active_calls,
+        )
+    except ManagerRequestError as e:
+        print(e)
+        sys.exit(1)
+    except RequestException as e:
+        print(f"Error: Unable to reach the Manager at {first.manager_url}. {e}")
+        sys.exit(1)
+    finally:
+        context.close()
+
+    if isinstance(args, (list, Iterator)):
+        _print_summary(results, DELETE_LABELS)
+    if any(outcome == FAILED for outcome, _ in results.values()):
+        raise BatchFailed(results)
+    return results
+
+
+def _plan(args):
+    """ Compute the Plan for the desired nodes in 'args'. Returns (first, context, changes). """
+    from requests import RequestException
+    from .models import PexipClient
+    from .reconcile import compute_plan
+
+    first, desired = _split_batch(args)
+    if first is None:
+        return None, None, None
+    desired = _preflight(first, desired)
+    context = RunContext.from_args(first, batch=True)
+    try:
+        changes = compute_plan(desired, PexipClient(first, context=context), prune=first.prune)
+    except ManagerRequestError as e:
+        print(e)
+        context.close()
+        sys.exit(1)
+    except RequestException as e:
+        print(f"Error: Unable to reach the Manager at {first.manager_url}. {e}")
+        context.close()
+        sys.exit(1)
+    return first, context, changes
+
+
+def plan(args):
+    """ Show what 'apply' would change within the Manager, without changing anything. """
+    first, context, changes = _plan(args)
+    if changes is None:
+        return
+    context.close()
+    changes.print()
+
+
+def apply(args):
+    """ Reconcile the Manager with the desired nodes, executing only the planned changes. """
+    from .models import PexipClient
+    from .provision import BootstrapPipeline
+
+    first, context, changes = _plan(args)
+    if changes is None:
+        return
+    changes.print()
+    if changes.empty:
+        print("No changes were made.")
+        context.close()
+        if changes.invalid:
+            raise BatchFailed({})
+        return
+
+    results = {}
+    if changes.to_delete:
+        results.update(
+            delete_batch(
+                [node for node, _ in changes.to_delete],
+                PexipClient(first, context=context),
+                parallel=first.parallel or 1,
+                context=context,
+                check_active_calls=first.check_active_calls,
+            )
+        )
+    if changes.to_create:
+        results.update(
+            create_batch(
+                changes.to_create,
+                parallel=first.parallel or 1,
+                context=context,
+                pipeline=BootstrapPipeline.from_args(first, context=context),
+            )
+        )
+    context.close()
+
+    _print_summary(results, APPLY_LABELS)
+    if changes.invalid or any(outcome == FAILED for outcome, _ in results.values()):
+        raise BatchFailed(results)
+    return results
+
+
+def snapshot(args):
+    """ Write a compressed copy of every Manager listing, fetched concurrently. """
+    from .models import PexipClient
+    from .snapshot import Snapshot
+
+    context = RunContext.from_args(args)
+    try:
+        with tracing.span("snapshot"):
+            snap = Snapshot.take(PexipClient(args, context=context), parallel=args.parallel)
+    finally:
+        context.close()
+
+    for endpoint, error in snap.errors.items():
+        print(f"Warning: '{endpoint}' was left out of the snapshot. {error}")
+    if not snap.objects:
+        print("Error: Unable to list any Manager configuration.")
+        sys.exit(1)
+    snap.write(args.output)
+    total = sum(len(objects) for objects in snap.objects.values())
+    print(f"Wrote {total} objects from {len(snap.objects)} endpoints to {args.output}")
+
+
+def status(args):
+    """ Print the state of every node, refreshed from one status sweep and concurrent probes. """
+    from .models import PexipClient
+    from .status import FleetStatus, watch
+
+    context = RunContext.from_args(args)
+    fleet = FleetStatus(PexipClient(args, context=context), parallel=args.parallel)
+    try:
+        with tracing.span("status"):
+            if args.watch:
+                watch(fleet, args.watch)
+            else:
+                fleet.refresh()
+                fleet.print()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.close()
+        context.close()
 
 
 def bootstrap(args):
-    with open(args.xml_file, "rb") as xml_file:
-        provision(xml_file, args.node_address)
+    from .models import drain_spool, provision
+    from .payload import BootstrapPayload
+    from .provision import BootstrapPipeline
+    from .spool import Spool
+
+    if args.spool:
+        spool = Spool(args.spool_dir)
+        if not len(spool):
+            print(f"No pending bootstraps found in {spool.directory}.")
+            return
+        results = drain_spool(spool, BootstrapPipeline.from_args(args))
+        failed = [hostname for hostname, error in results.items() if error]
+        print(f"Summary: {len(results) - len(failed)} bootstrapped, {len(failed)} failed.")
+        if failed:
+            sys.exit(1)
+        return
+
+    if not args.xml_file or not args.node_address:
+        print("Error: --xml-file and --node-address are required, unless --spool is given.")
+        sys.exit(1)
+
+    try:
+        provision(BootstrapPayload(args.xml_file), args.node_address, args)
+    except ProvisioningError:
+        sys.exit(1)
+
+
+def serve(args):
+    """ Run the 'pexip serve' daemon until interrupted. """
+    from .remote import get_default_socket_path, get_default_token_path
+    from .serve import Daemon, make_server, write_token
+
+    socket_path = None
+    if args.port is None:
+        socket_path = str(args.socket or get_default_socket_path())
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    daemon = Daemon.from_args(args)
+    server = make_server(daemon, socket_path=socket_path, host=args.host, port=args.port)
+    if socket_path:
+        address = f"unix:{socket_path}"
+    else:
+        token_file = str(args.token_file or get_default_token_path())
+        write_token(server.token, token_file)
+        address = f"http://{args.host}:{args.port}, with the token in {token_file}"
+    print(f"Serving create, delete and bootstrap at {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def forward(server, action, data, options) -> bool:
+    """Run a command on the 'pexip serve' daemon at 'server', reporting its results as if it
+    had run locally. Returns False, for it to run locally, when no daemon is listening."""
+    from .exceptions import ServeUnavailable
+    from .preflight import print_problems
+    from .remote import send
+
+    try:
+        response = send(server, action, data, options)
+    except ServeUnavailable as e:
+        print(f"Note: {e} Running locally.")
+        return False
+    except InventoryError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if response.get("problems"):
+        print_problems(response["problems"])
+    if response.get("error"):
+        print(f"Error: {response['error']}")
+    results = {hostname: tuple(result) for hostname, result in response.get("results", {}).items()}
+    if results:
+        labels = {"create": CREATE_LABELS, "delete": DELETE_LABELS}.get(action, BOOTSTRAP_LABELS)
+        _print_summary(results, labels)
+    if response.get("exit"):
+        sys.exit(response["exit"])
+    return True
+
+
+class _ManagerOutput:
+    """Stands in for sys.stdout while several Managers run at once. What each Manager's own
+    thread prints (plans, status tables, summaries) is held back, then printed together
+    under a '== <manager> ==' header once that Manager has finished. Other threads (node
+    workers, whose lines name their node) write straight through."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        buffer = self._buffers.get(threading.get_ident())
+        if buffer is None:
+            with self._lock:
+                return self.stream.write(text)
+        buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    @contextmanager
+    def manager(self, name):
+        """ Hold back what the current thread prints, for the Manager 'name'. """
+        ident = threading.get_ident()
+        self._buffers[ident] = []
+        try:
+            yield
+        finally:
+            text = "".join(self._buffers.pop(ident))
+            with self._lock:
+                self.stream.write(f"== {name} ==\n{text}")
+                self.stream.flush()
+
+
+def fan_out(action, managers):
+    """Run 'action' against every Manager in 'managers' (name -> data) at the same time.
+    Each Manager's run builds its own RunContext, so has its own connection pools, lookup
+    cache and limits. Each Manager's output is printed under its name as it finishes, and
+    the node outcomes of every Manager are summarized once all finish."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    output = _ManagerOutput(sys.stdout)
+
+    def _run(name, data):
+        with output.manager(name), tracing.span("manager", manager=name):
+            try:
+                return (action(data), None)
+            except BatchFailed as e:
+                return (e.results, e)
+            except SystemExit as e:
+                return (None, e if e.code else None)
+            except Exception as e:
+                print(f"Error: Run against Manager {name} failed. {e}")
+                return (None, e)
+
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=len(managers)) as executor:
+            futures = {name: executor.submit(_run, name, data) for name, data in managers.items()}
+            results = {name: future.result() for name, future in futures.items()}
+    finally:
+        sys.stdout = output.stream
+
+    failed = [name for name, (_, error) in results.items() if error is not None]
+    print(f"Managers: {len(results) - len(failed)} succeeded, {len(failed)} failed.")
+    for name, (outcomes, error) in results.items():
+        counts = {}
+        for outcome, _ in (outcomes or {}).values():
+            counts[outcome] = counts.get(outcome, 0) + 1
+        summary = ", ".join(f"{count} {APPLY_LABELS[o]}" for o, count in counts.items())
+        status = "failed" if name in failed else "ok"
+        print(f"  {name}: {status}" + (f", {summary}" if summary else ""))
+    if failed:
+        sys.exit(1)
 
 
 def main(args=sys.argv):
@@ -41,7 +608,39 @@ def main(args=sys.argv):
     from .cli.args import parser
 
     data, action = parser.parse_args(args=args)
+    options = parser.args
+
+    if options.server and action != "serve":
+        from .remote import forwardable
 
-    actions = {"create": create, "delete": delete, "bootstrap": bootstrap}
+        if forwardable(action, data, options) and forward(options.server, action, data, options):
+            return
 
-    actions[action](data)
+    actions = {
+        "create": create,
+        "delete": delete,
+        "plan": plan,
+        "apply": apply,
+        "bootstrap": bootstrap,
+        "snapshot": snapshot,
+        "status": status,
+        "serve": serve,
+    }
+
+    tracer = tracing.enable() if options.trace else None
+    registry = metrics.enable() if options.metrics else None
+    try:
+        with tracing.profile(options.profile):
+            if isinstance(data, dict):
+                fan_out(actions[action], data)
+            else:
+                actions[action](data)
+    except InventoryError as e:
+        # Inventories are streamed, so a malformed one is only noticed as it is read.
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        if tracer:
+            tracer.export(options.trace, options.trace_format)
+        if registry:
+            registry.write(options.metrics)
@@ -0,0 +1,52 @@
+from .cli.definitions import REQUIRED_CREATE_ARGS
+
+# Options every node may set for itself, stored within the node's own slots.
+NODE_FIELDS = tuple(REQUIRED_CREATE_ARGS)
+
+
+class NodeSpec:
+    """The options of a single node, layered on top of options shared by every node.
+
+    Node options a record sets for itself ('NODE_FIELDS') are kept in slots, any other
+    per-node override in a small 'overrides' dictionary, and everything else is read
+    from 'defaults': the CLI arguments and config file values, or another NodeSpec.
+    The shared layer is never copied, so a record costs the same however many global
+    options there are. Options set nowhere read as None.
+    """
+
+    __slots__ = ("defaults", "overrides") + NODE_FIELDS
+
+    def __init__(self, defaults=None, **options):
+        object.__setattr__(self, "defaults", defaults)
+        object.__setattr__(self, "overrides", None)
+        for name, value in options.items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        # Only called for unset slots and names that aren't slots.
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if self.overrides and name in self.overrides:
+            return self.overrides[name]
+        return getattr(self.defaults, name, None)
+
+    def __setattr__(self, name, value):
+        if name in NODE_FIELDS:
+            object.__setattr__(self, name, value)
+        else:
+            if self.overrides is None:
+                object.__setattr__(self, "overrides", {})
+            self.overrides[name] = value
+
+    def own_options(self) -> dict:
+        """ The options set on this record itself, without the shared defaults. """
+        options = {}
+        for name in NODE_FIELDS:
+            try:
+                options[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        return {**options, **(self.overrides or {})}
+
+    def __repr__(self):
+        return f"NodeSpec(hostname={self.hostname!r})"
@@ -0,0 +1,139 @@
+import json
+import codecs
+
+# Optional, faster JSON backends: ijson (with its yajl2 C backend) to stream listings, and
+# orjson to decode whole documents. The standard library is used for either when missing.
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bytes of a (decompressed) Manager response read at a time.
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_SCALAR_EVENTS = ("null", "boolean", "integer", "double", "number", "string")
+_decoder = json.JSONDecoder()
+
+
+def loads(content):
+    """ Decode a whole JSON document, with orjson when it is installed. """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def iter_listing(response, meta=None):
+    """Iterate over the 'objects' of a Tastypie listing, decoded as the body is read.
+
+    'response' must have been sent with stream=True; a gzip compressed body is decompressed
+    as it is read. Only a single chunk of the body and a single object are held in memory
+    at a time. The listing's 'meta' fields (e.g. 'next') are stored in the 'meta' dictionary
+    passed in, complete once the iterator is exhausted.
+    """
+    meta = {} if meta is None else meta
+    if ijson is not None:
+        return _iter_ijson(response, meta)
+    return _iter_stdlib(response, meta)
+
+
+def _iter_ijson(response, meta):
+    response.raw.decode_content = True
+    builder = None
+    for prefix, event, value in ijson.parse(response.raw, buf_size=CHUNK_SIZE, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == "objects.item" and event in ("end_map", "end_array"):
+                yield builder.value
+                builder = None
+        elif prefix == "objects.item":
+            if event in ("start_map", "start_array"):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            else:
+                yield value
+        elif prefix.startswith("meta.") and event in _SCALAR_EVENTS:
+            meta[prefix[len("meta.") :]] = value
+
+
+class _Reader:
+    """ A window over a streamed JSON document, decoding one value at a time. """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.done = False
+
+    def _fill(self) -> bool:
+        """ Read the next chunk, dropping everything already decoded. Returns False at EOF. """
+        if self.done:
+            return False
+        chunk = next(self.chunks, None)
+        self.done = chunk is None
+        self.buffer = self.buffer[self.pos :] + self.text.decode(chunk or b"", final=self.done)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """ The next character that isn't whitespace, without consuming it. """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def expect(self, allowed) -> str:
+        """ Consume the next character, which must be one of 'allowed'. """
+        char = self.peek()
+        if not char or char not in allowed:
+            raise json.JSONDecodeError(f"Expecting one of {allowed!r}", self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def value(self):
+        """ Decode the next complete value, reading more of the document until it is. """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number may continue into the next chunk.
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_stdlib(response, meta):
+    reader = _Reader(iter(response.iter_content(CHUNK_SIZE)))
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == "objects":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(",]") == "]":
+                        break
+        elif key == "meta":
+            meta.update(reader.value() or {})
+        else:
+            reader.value()
+        if reader.expect(",}") == "}":
+            return
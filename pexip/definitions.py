@@ -27,9 +27,54 @@ PLATFORM_MAP = {
 
 API_MAP = {**SYSTEM_MAP, **PLATFORM_MAP}
 
+STATUS_MAP = {
+    "node_status": "/api/admin/status/v1/worker_vm/",
+    "participant": "/api/admin/status/v1/participant/",
+}
+
+# Number of objects requested per page when iterating over a Manager listing.
+DEFAULT_PAGE_SIZE = 100
+
+# How single objects are looked up within the Manager:
+#   filter  - one server side filtered query per lookup, e.g. 'worker_vm/?name=<hostname>'
+#   listing - fetch each listing once per run and index it in the shared lookup cache
+LOOKUP_FILTER = "filter"
+LOOKUP_LISTING = "listing"
+LOOKUP_MODES = [LOOKUP_FILTER, LOOKUP_LISTING]
+
+# Default size of the keep-alive connection pools. 'pool_connections' is the number of hosts to
+# keep a pool for, 'pool_maxsize' the number of connections kept open to each host.
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
 # Default data object for Node creation.
 DEFAULT_CREATE_DATA = {
     "description": "Transcoding Node",
     "node_type": "CONFERENCING",
     "deployment_type": "MANUAL-PROVISION-ONLY",
 }
+
+# Bootstrapping a freshly launched Conferencing Node.
+BOOTSTRAP_PORT = 8443
+BOOTSTRAP_URL = "https://{address}:{port}/configuration/bootstrap"
+BOOTSTRAP_RETRY_STATUSES = (500, 502, 503, 504)
+DEFAULT_BOOTSTRAP_PARALLEL = 32  # Nodes probed or bootstrapped at the same time.
+DEFAULT_BOOTSTRAP_DEADLINE = 600  # Seconds to wait for a single node to accept its config.
+DEFAULT_BOOTSTRAP_POLL_INTERVAL = 5  # Average seconds between readiness checks, jittered.
+
+# Client side limits on the requests sent to a Manager.
+DEFAULT_MANAGER_RATE = 0  # Requests per second, 0 leaves only the adaptive concurrency.
+DEFAULT_MANAGER_BURST = 20  # Requests that may be sent at once after an idle period.
+DEFAULT_MANAGER_SLOW_RESPONSE = 2.0  # Seconds after which a response counts as congestion.
+MANAGER_BACKOFF_STATUSES = (429, 500, 502, 503, 504)  # Responses which shrink concurrency.
+MANAGER_RETRY_AFTER_STATUSES = (429, 503)  # Responses retried after their Retry-After.
+MANAGER_RETRY_AFTER_ATTEMPTS = 3  # Times a request is retried after a Retry-After.
+
+# Number of Manager listings fetched at the same time by 'pexip snapshot'.
+DEFAULT_SNAPSHOT_PARALLEL = 8
+
+# 'pexip serve' listens on a Unix socket, unless given a --port (which requires a token).
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 8765  # Port of a '--server http://<host>' given without one.
+DEFAULT_SERVE_PARALLEL = 32  # Nodes created or deleted at the same time, across requests.
+DEFAULT_SERVE_CACHE_REFRESH = 300  # Seconds before warm Manager listings are fetched again.
@@ -1,7 +1,32 @@
-
-
 class TranscoderAlreadyExists(Exception):
     pass
 
 class MissingArgumentError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class NodeCreationError(Exception):
+    pass
+
+class ProvisioningError(Exception):
+    pass
+
+class ManagerRequestError(Exception):
+    pass
+
+class InventoryError(Exception):
+    pass
+
+class TranscoderNotFound(Exception):
+    pass
+
+class TranscoderInUse(Exception):
+    pass
+
+class NodeDeletionError(Exception):
+    pass
+
+class ConfigurationNotFound(Exception):
+    pass
+
+class ServeUnavailable(Exception):
+    pass
@@ -0,0 +1,151 @@
+import json
+
+from .exceptions import InventoryError
+
+# Number of characters read from the inventory at a time.
+CHUNK_SIZE = 64 * 1024
+
+
+class _JSONStream:
+    """ Decode JSON values one at a time from a file object, reading it in chunks. """
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self) -> bool:
+        """ Read another chunk into the buffer, dropping what has already been decoded. """
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """ Return the next non-whitespace character, or None at the end of the file. """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return None
+
+    def skip(self, char):
+        if self.peek() != char:
+            raise InventoryError(f"Expected '{char}' at position {self.pos} of the inventory.")
+        self.pos += 1
+
+    def decode(self):
+        """ Decode the next complete JSON value. """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if not self._read():
+                    raise InventoryError(f"Invalid JSON within the inventory: {e}")
+                continue
+            # A number or literal at the end of the buffer may continue in the next chunk.
+            if end == len(self.buffer) and not isinstance(value, (dict, list, str)):
+                if self._read():
+                    continue
+            self.pos = end
+            return value
+
+
+def _iter_array(stream):
+    """ Yield every element of a JSON array, one at a time. """
+    stream.skip("[")
+    if stream.peek() == "]":
+        stream.pos += 1
+        return
+    while True:
+        yield stream.decode()
+        if stream.peek() == "]":
+            stream.pos += 1
+            return
+        stream.skip(",")
+
+
+def _iter_terraform_outputs(outputs):
+    """Yield node records from 'terraform output -json'. Every output whose value is a list of
+    objects, or a map of hostname -> object, is treated as part of the inventory."""
+    for output in outputs.values():
+        value = output.get("value")
+        if isinstance(value, list):
+            yield from (node for node in value if isinstance(node, dict))
+        elif isinstance(value, dict):
+            if "hostname" in value:
+                yield value
+                continue
+            for hostname, node in value.items():
+                if isinstance(node, dict):
+                    yield {"hostname": hostname, **node}
+
+
+def _iter_managers(managers):
+    """ Yield node records from an inventory keyed by Manager, naming each one's Manager. """
+    for manager, nodes in managers.items():
+        for node in nodes:
+            if isinstance(node, str):
+                node = {"hostname": node}
+            yield {**node, "manager": manager}
+
+
+def _is_terraform_outputs(document) -> bool:
+    return bool(document) and all(isinstance(v, dict) and "value" in v for v in document.values())
+
+
+def _is_manager_map(document) -> bool:
+    return bool(document) and all(isinstance(v, list) for v in document.values())
+
+
+def read_inventory(fp, chunk_size=CHUNK_SIZE):
+    """Yield one dictionary per node from an inventory file object.
+
+    Supports a plain JSON array of nodes, NDJSON (one node object per line), the output
+    of 'terraform output -json' and an object of Manager -> array of nodes. Arrays and
+    NDJSON are streamed, so the first nodes are available before the rest of the inventory
+    has been read. The shape is decided once for the whole file: a '.ndjson' or '.jsonl'
+    file, or one holding more than one object, is NDJSON, and every object a node.
+    """
+    stream = _JSONStream(fp, chunk_size)
+    char = stream.peek()
+    if char is None:
+        return
+    if char == "[":
+        yield from _iter_array(stream)
+        if stream.peek() is not None:
+            raise InventoryError("Unexpected data after the inventory's array of nodes.")
+        return
+    if char != "{":
+        raise InventoryError(f"Unexpected '{char}' within the inventory.")
+
+    document = stream.decode()
+    ndjson = str(getattr(fp, "name", "")).endswith((".ndjson", ".jsonl"))
+    if not ndjson and stream.peek() is None:
+        if _is_terraform_outputs(document):
+            yield from _iter_terraform_outputs(document)
+        elif _is_manager_map(document):
+            yield from _iter_managers(document)
+        else:
+            yield document
+        return
+
+    yield document
+    while True:
+        char = stream.peek()
+        if char is None:
+            return
+        if char != "{":
+            raise InventoryError(f"Unexpected '{char}' within the NDJSON inventory.")
+        yield stream.decode()
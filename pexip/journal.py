@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import threading
+
+from pathlib import Path
+
+from .payload import BootstrapPayload
+
+# Phases of a node's creation, in the order they are completed.
+VALIDATED = "validated"
+CREATED = "created"
+XML_RECEIVED = "xml_received"
+BOOTSTRAPPED = "bootstrapped"
+PHASES = [VALIDATED, CREATED, XML_RECEIVED, BOOTSTRAPPED]
+
+
+class Journal:
+    """An append-only record of the phases each node of a run has completed.
+
+    Every phase is written as one JSON line, and flushed to disk before the run moves on, so
+    a crashed or interrupted run can be resumed from the journal without asking the Manager
+    what was done. The bootstrap XML of each node is kept beside the journal, in
+    '<journal>.d/<hostname>.xml', as the Manager only ever returns it once.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = Path(path)
+        self.xml_dir = Path(f"{self.path}.d")
+        self.resume = resume
+        self.phases = {}
+        self._lock = threading.Lock()
+        if resume:
+            self._load()
+        else:
+            self._truncate()
+
+    @classmethod
+    def from_args(cls, args):
+        """ The Journal of '--journal', if given, loaded for '--resume'. """
+        path = getattr(args, "journal", None)
+        if not path:
+            return None
+        return cls(path, resume=getattr(args, "resume", False))
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with self.path.open("rt") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash can leave the last line half written, that phase wasn't recorded.
+                    continue
+                self.phases.setdefault(record["hostname"], set()).add(record["phase"])
+
+    def _truncate(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text("")
+
+    def _append(self, hostname, phase):
+        line = json.dumps({"hostname": hostname, "phase": phase, "at": time.time()})
+        with self._lock:
+            with self.path.open("at") as f:
+                f.write(line + os.linesep)
+                f.flush()
+                os.fsync(f.fileno())
+            self.phases.setdefault(hostname, set()).add(phase)
+
+    def record(self, hostname, phase, content=None):
+        """Record that 'hostname' completed 'phase'. When recording XML_RECEIVED, the
+        bootstrap XML 'content' is stored first, unless it was already streamed to
+        'xml_path', so the phase is never recorded without it."""
+        if phase == XML_RECEIVED and content is not None:
+            partial = self.xml_path(hostname).with_suffix(".xml.tmp")
+            partial.write_bytes(content)
+            os.replace(partial, self.xml_path(hostname))
+        self._append(hostname, phase)
+
+    def completed(self, hostname, phase) -> bool:
+        return phase in self.phases.get(hostname, ())
+
+    def last_phase(self, hostname):
+        """ The latest phase completed by 'hostname', or None if it was never started. """
+        completed = self.phases.get(hostname, ())
+        return next((phase for phase in reversed(PHASES) if phase in completed), None)
+
+    def xml_path(self, hostname) -> Path:
+        """ Where the bootstrap XML of 'hostname' is kept. """
+        self.xml_dir.mkdir(parents=True, exist_ok=True)
+        return self.xml_dir / f"{hostname}.xml"
+
+    def payload(self, hostname) -> BootstrapPayload:
+        return BootstrapPayload(self.xml_path(hostname))
@@ -0,0 +1,163 @@
+import time
+import threading
+
+from contextlib import contextmanager, nullcontext
+from email.utils import parsedate_to_datetime
+
+from . import metrics
+from .definitions import (
+    DEFAULT_MANAGER_BURST,
+    DEFAULT_MANAGER_RATE,
+    DEFAULT_MANAGER_SLOW_RESPONSE,
+    DEFAULT_POOL_MAXSIZE,
+    MANAGER_BACKOFF_STATUSES,
+    MANAGER_RETRY_AFTER_ATTEMPTS,
+    MANAGER_RETRY_AFTER_STATUSES,
+)
+
+
+def parse_retry_after(value):
+    """ Seconds to wait from a Retry-After header, either delay-seconds or an HTTP date. """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def limiter_options(args, max_concurrency=DEFAULT_POOL_MAXSIZE) -> dict:
+    """ ManagerLimiter arguments from the CLI arguments, or the Manager's config file. """
+    return {
+        "rate": getattr(args, "manager_rate", None) or DEFAULT_MANAGER_RATE,
+        "burst": getattr(args, "manager_burst", None) or DEFAULT_MANAGER_BURST,
+        "max_concurrency": getattr(args, "manager_concurrency", None) or max_concurrency,
+    }
+
+
+class ManagerLimiter:
+    """Client side backpressure for every request sent to one Manager, from any thread.
+
+    A token bucket caps the request rate at 'rate' per second (bursts of up to 'burst'),
+    when 'rate' is set. On top of it, the number of requests in flight adapts AIMD style:
+    it grows by one for every 'limit' healthy responses, up to 'max_concurrency', and is
+    halved (down to 'min_concurrency') on an error response, a connection failure or a
+    response slower than 'slow_response' seconds. It is halved at most once per
+    'slow_response' seconds, so one burst of errors only counts once.
+    A Retry-After answer stops every request to the Manager until it has passed.
+    """
+
+    def __init__(
+        self,
+        rate=DEFAULT_MANAGER_RATE,
+        burst=DEFAULT_MANAGER_BURST,
+        max_concurrency=DEFAULT_POOL_MAXSIZE,
+        min_concurrency=1,
+        slow_response=DEFAULT_MANAGER_SLOW_RESPONSE,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.slow_response = slow_response
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _wait_time(self, now):
+        """ Seconds until a request may be sent, 0 if it may be sent now. """
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rate and self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0
+
+    def acquire(self):
+        """ Block until a request may be sent to the Manager. """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self.in_flight < int(self.limit):
+                    wait = self._wait_time(now)
+                    if not wait:
+                        break
+                else:
+                    # Woken up once a request in flight finishes.
+                    wait = None
+                self._cond.wait(timeout=wait)
+            if self.rate:
+                self._tokens -= 1
+            self.in_flight += 1
+
+    def release(self, status=None, elapsed=0.0, retry_after=None):
+        """Report how a request went. 'status' is None when no response was received.
+        'retry_after' is the Retry-After header of the response, if any."""
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            delay = parse_retry_after(retry_after)
+            if delay:
+                self._paused_until = max(self._paused_until, now + delay)
+            congested = (
+                status is None or status in MANAGER_BACKOFF_STATUSES or elapsed > self.slow_response
+            )
+            if congested:
+                if now - self._last_decrease > self.slow_response:
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    @contextmanager
+    def request(self):
+        """Hold a request slot for the enclosed block. Set the response on the yielded
+        dictionary ('response') so the limiter can adapt to it."""
+        self.acquire()
+        outcome = {}
+        start = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            response = outcome.get("response")
+            self.release(
+                status=response.status_code if response is not None else None,
+                elapsed=time.monotonic() - start,
+                retry_after=response.headers.get("Retry-After") if response is not None else None,
+            )
+
+
+def paced_request(send, limiter=None, attempts=MANAGER_RETRY_AFTER_ATTEMPTS):
+    """Return the response of 'send(attempt)', sent once 'limiter' (if any) allows it.
+    A response asking to retry after a Retry-After is sent again once that has passed,
+    up to 'attempts' more times."""
+    for attempt in range(attempts + 1):
+        with limiter.request() if limiter else nullcontext({}) as outcome:
+            response = send(attempt)
+            outcome["response"] = response
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if response.status_code not in MANAGER_RETRY_AFTER_STATUSES or retry_after is None:
+            break
+        if attempt < attempts:
+            print(f"Note: Manager asked to retry {response.url} in {retry_after:.0f}s.")
+            metrics.retried(response.url)
+            response.close()
+            if not limiter:
+                # Otherwise, the limiter holds back every request to the Manager until then.
+                time.sleep(retry_after)
+    return response
@@ -0,0 +1,188 @@
+import os
+import threading
+
+from urllib.parse import urlparse
+
+from .definitions import API_MAP, STATUS_MAP
+
+# Upper bounds (in seconds) of the latency histogram buckets.
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+NODE_BUCKETS = (10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0)
+
+# Every metric family: name -> (type, help, histogram buckets)
+FAMILIES = {
+    "pexip_http_requests": (
+        "counter",
+        "HTTP requests sent, by target (manager or bootstrap), route, method and status.",
+        None,
+    ),
+    "pexip_http_request_duration_seconds": (
+        "histogram",
+        "Time from sending an HTTP request to receiving its response headers.",
+        REQUEST_BUCKETS,
+    ),
+    "pexip_http_retries": (
+        "counter",
+        "Requests retried by urllib3 before a response was returned, by target and route.",
+        None,
+    ),
+    "pexip_bootstrap_retries": (
+        "counter",
+        "Bootstrap attempts repeated because a node was not reachable or ready yet.",
+        None,
+    ),
+    "pexip_node_provisioning_seconds": (
+        "histogram",
+        "Time from starting a node's creation to it being bootstrapped, by outcome.",
+        NODE_BUCKETS,
+    ),
+}
+
+# Manager routes, longest first, so the most specific route matches a request path.
+_ROUTES = sorted(
+    ((route, endpoint) for endpoint, route in {**API_MAP, **STATUS_MAP}.items()),
+    key=lambda item: -len(item[0]),
+)
+
+# The Registry metrics are recorded into, or None while metrics are disabled.
+registry = None
+
+
+def _labels(labels) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Registry:
+    """Counters and histograms aggregated over a run, from any thread, and rendered in the
+    OpenMetrics text format for node_exporter's textfile collector."""
+
+    def __init__(self):
+        self.counters = {name: {} for name, family in FAMILIES.items() if family[0] == "counter"}
+        # name -> labels -> [bucket counts..., sum, count]
+        self.histograms = {
+            name: {} for name, family in FAMILIES.items() if family[0] == "histogram"
+        }
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self.counters[name][key] = self.counters[name].get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = FAMILIES[name][2]
+        key = _labels(labels)
+        with self._lock:
+            series = self.histograms[name].setdefault(key, [0] * (len(buckets) + 2))
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (kind, description, buckets) in FAMILIES.items():
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"# HELP {name} {description}")
+                if kind == "counter":
+                    for labels, value in sorted(self.counters[name].items()):
+                        lines.append(f"{name}_total{_format_labels(labels)} {value}")
+                    continue
+                for labels, series in sorted(self.histograms[name].items()):
+                    for bound, count in zip(buckets, series):
+                        le = _format_labels(labels, [("le", bound)])
+                        lines.append(f"{name}_bucket{le} {count}")
+                    le = _format_labels(labels, [("le", "+Inf")])
+                    lines.append(f"{name}_bucket{le} {series[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {series[-2]}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {series[-1]}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to 'path', replacing it atomically so the textfile collector
+        never reads a partial file."""
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, "wt") as f:
+            f.write(self.render())
+        os.replace(partial, path)
+        print(f"Wrote metrics to {path}")
+
+
+def enable() -> Registry:
+    """ Start recording metrics for the rest of the run. """
+    global registry
+    registry = Registry()
+    return registry
+
+
+def inc(name, value=1, **labels):
+    """ Increment a counter, if metrics are enabled. """
+    if registry is not None:
+        registry.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    """ Record a histogram observation, if metrics are enabled. """
+    if registry is not None:
+        registry.observe(name, value, **labels)
+
+
+def _route(url):
+    """ The (target, route) a request URL belongs to: a Manager endpoint, or a bootstrap. """
+    # Node creation is POSTed to '<manager>//api/...', so collapse the leading slashes.
+    path = "/" + urlparse(url).path.lstrip("/")
+    if path.endswith("/configuration/bootstrap"):
+        return "bootstrap", "bootstrap"
+    for route, endpoint in _ROUTES:
+        if path.startswith(route):
+            return "manager", endpoint
+    return "other", "other"
+
+
+def retried(url):
+    """ Count a request to 'url' sent again: after a Retry-After, or a repeated bootstrap. """
+    if registry is not None:
+        target, route = _route(url)
+        registry.inc("pexip_http_retries", target=target, route=route)
+
+
+def _record_response(response, *args, **kwargs):
+    """ A requests response hook recording every response received through a session. """
+    if registry is None:
+        return
+    target, route = _route(response.request.url)
+    method = response.request.method
+    registry.inc(
+        "pexip_http_requests",
+        target=target,
+        route=route,
+        method=method,
+        status=response.status_code,
+    )
+    registry.observe(
+        "pexip_http_request_duration_seconds",
+        response.elapsed.total_seconds(),
+        target=target,
+        route=route,
+        method=method,
+    )
+
+
+def instrument(session):
+    """ Record metrics for every response received through a requests 'session'. """
+    session.hooks["response"].append(_record_response)
+    return session
@@ -1,22 +1,43 @@
-import sys
 import json
 import time
 
+from concurrent.futures import Future
+
 import requests
-from requests.exceptions import ConnectTimeout
 
-from .utils import requests_retry_session
-from .exceptions import MissingArgumentError, TranscoderAlreadyExists
-from .definitions import API_MAP, DEFAULT_CREATE_DATA
+from . import journal, metrics, tracing
+from .data import NodeSpec
+from .decode import iter_listing, loads
+from .payload import BootstrapPayload
+from .limiter import paced_request
+from .provision import BootstrapPipeline
+from .spool import Spool
+from .exceptions import (
+    ManagerRequestError,
+    MissingArgumentError,
+    NodeCreationError,
+    NodeDeletionError,
+    ProvisioningError,
+    TranscoderAlreadyExists,
+    TranscoderInUse,
+    TranscoderNotFound,
+)
+from .definitions import (
+    API_MAP,
+    DEFAULT_CREATE_DATA,
+    DEFAULT_PAGE_SIZE,
+    LOOKUP_LISTING,
+    STATUS_MAP,
+)
 from .cli.definitions import REQUIRED_CREATE_ARGS
 
 
 class PexipConnection:
     """Abstract class for a connection to Pexip Meeting Manager."""
 
-    routes = API_MAP
+    routes = {**API_MAP, **STATUS_MAP}
 
-    def __init__(self, args):
+    def __init__(self, args, context=None):
         """ Minimal Requirements to establish a remote connection. """
         self.url = args.manager_url
         self.username = args.auth_user
@@ -28,13 +49,24 @@ class PexipConnection:
         # Flip --insecure (store_true) to Verify -> false
         self.verify = not args.insecure
 
-        # Create Client with Auth
-        self.client = requests.Session()
-        self.client.auth = (self.username, self.password)
+        # Create Client with Auth, reusing the run's keep-alive pool when there is one.
+        if context:
+            self.client = context.manager_session((self.username, self.password))
+        else:
+            self.client = metrics.instrument(requests.Session())
+            self.client.auth = (self.username, self.password)
+
+        # Number of objects to request per page of a Manager listing
+        self.page_size = getattr(args, "page_size", None) or DEFAULT_PAGE_SIZE
 
         # Store args for access later
         self.args = args
 
+        # State shared with other nodes within the same run, e.g. the lookup cache.
+        self.context = context
+        self.cache = context.cache if context else None
+        self.journal = context.journal if context else None
+
     def _filter_by(self, objs, key, val=None):
         """ Iterate over a list of dicts, search check each obj for key == val """
         for obj in objs:
@@ -48,32 +80,100 @@ class PexipConnection:
         else:
             print(f"Error {status}: Content: {content}")
 
-    def _get_config(self):
-        raise NotImplementedError()
+    def _request(self, method, url, endpoint=None, **kwargs):
+        """Send a request to the Manager, timed as a span of the node it is made for.
+        Requests are paced by the run's ManagerLimiter, and a request the Manager answers
+        with a Retry-After is sent again once that has passed."""
+        hostname = getattr(self.args, "hostname", None)
 
+        def _send(attempt):
+            with tracing.span(
+                f"manager.{method}", node=hostname, endpoint=endpoint, attempt=attempt
+            ) as span:
+                response = self.client.request(method, url, verify=self.verify, **kwargs)
+                span["status"] = response.status_code
+            return response
 
-class PexipClient(PexipConnection):
-    """ A Client for basic operations with a PexipManager """
+        limiter = self.context.limiter(self.url) if self.context else None
+        return paced_request(_send, limiter)
 
-    def _get_config(self, endpoint):
-        """ Requests config attributes from the Pexip Meeting Manager. """
-        route = self.routes[endpoint]
-        response = self.client.get(f"{self.url}{route}?limit=100", verify=self.verify)
-        if not response.ok:
-            self._log_error(response.status_code, response.content)
 
-        data = json.loads(response.content)
+class PexipClient(PexipConnection):
+    """ A Client for basic operations with a PexipManager """
 
-        return data
+    # (manager url, endpoint, key) combinations the Manager refused to filter on.
+    _unfilterable = set()
+
+    def _iter_config(self, endpoint, page_size=None, filters=None):
+        """Iterate over every object within a Manager listing, one page at a time.
+        Follows the Tastypie 'meta.next' links until the listing is exhausted, so callers
+        that stop early (e.g. '_filter_by') never request the remaining pages. Each page is
+        decoded as it streams in, so only one object of it is held in memory at a time.
+        'filters' are Tastypie filters (e.g. {'last_updated__gte': ...}) of the listing."""
+        url = f"{self.url}{self.routes[endpoint]}"
+        params = {"limit": page_size or self.page_size, **(filters or {})}
+        while url:
+            response = self._request("get", url, endpoint=endpoint, params=params, stream=True)
+            meta = {}
+            try:
+                if not response.ok:
+                    self._log_error(response.status_code, response.content)
+                    raise ManagerRequestError(
+                        f"Error: Unable to list '{endpoint}'. "
+                        f"Status code: {response.status_code}."
+                    )
+                yield from iter_listing(response, meta)
+            finally:
+                response.close()
+
+            # 'next' is a path relative to the Manager, with the limit/offset already applied.
+            next_page = meta.get("next")
+            url = f"{self.url}{next_page}" if next_page else None
+            params = None
+
+    def _query(self, endpoint, key, val):
+        """Find a single object within an endpoint where key == val, asking the Manager to
+        filter the listing server side (e.g. 'worker_vm/?name=<hostname>'). Falls back to
+        scanning the full listing if the endpoint does not support filtering on 'key'."""
+        filter_key = (self.url, endpoint, key)
+        if filter_key not in self._unfilterable:
+            response = self._request(
+                "get",
+                f"{self.url}{self.routes[endpoint]}",
+                endpoint=endpoint,
+                params={key: val, "limit": self.page_size},
+            )
+            if response.status_code == 400:
+                # Tastypie answers 400 when a field does not allow filtering.
+                print(f"Note: '{endpoint}' cannot be filtered by '{key}'. Scanning listing.")
+                self._unfilterable.add(filter_key)
+            elif not response.ok:
+                self._log_error(response.status_code, response.content)
+                raise ManagerRequestError(
+                    f"Error: Unable to query '{endpoint}'. Status code: {response.status_code}."
+                )
+            else:
+                objects = loads(response.content).get("objects", [])
+                match = self._filter_by(objects, key=key, val=val)
+                if match or not objects:
+                    return match
+                # Objects came back, but none matched: the filter was silently ignored.
+                self._unfilterable.add(filter_key)
+
+        return self._filter_by(self._iter_config(endpoint), key=key, val=val)
+
+    def _lookup(self, endpoint, key, val):
+        """Find a single object within an endpoint where key == val. Uses the shared
+        lookup cache in 'listing' mode, otherwise a server side filtered query."""
+        if self.cache and self.context.lookup == LOOKUP_LISTING:
+            return self.cache.lookup(self, endpoint, key, val)
+        return self._query(endpoint, key, val)
 
     def _get_tls_config(self, tls_certificate_subject_name):
         """Fetch the ID of the supplied TLS Certificate Subject Name and return a
         string pointing at its full path on system."""
 
-        data = self._get_config("tls_cert")
-        tls_cert_id = self._filter_by(
-            data.get("objects", {}), key="subject_name", val=tls_certificate_subject_name
-        )
+        tls_cert_id = self._lookup("tls_cert", key="subject_name", val=tls_certificate_subject_name)
         if not tls_cert_id:
             raise Exception(
                 f"Error: TLS Certificate ID with name '{tls_certificate_subject_name}' was unable to be found."
@@ -85,10 +185,7 @@ class PexipClient(PexipConnection):
         """Fetch the ID of the supplied System Location and return a
         string pointing at its full path on system."""
 
-        data = self._get_config("system_location")
-        system_location_id = self._filter_by(
-            data.get("objects", {}), key="name", val=system_location_name
-        )
+        system_location_id = self._lookup("system_location", key="name", val=system_location_name)
         if not system_location_id:
             raise Exception(
                 f"Error: System Location with name '{system_location_name}' was unable to be found."
@@ -98,8 +195,7 @@ class PexipClient(PexipConnection):
 
     def _node_exists(self, hostname) -> bool:
         """ Check if a specific node exists within Manager's 'worker_vm' API """
-        data = self._get_config("node")
-        return bool(self._filter_by(data.get("objects", {}), key="name", val=hostname))
+        return bool(self._lookup("node", key="name", val=hostname))
 
     def _sanity_check(self):
         for arg in REQUIRED_CREATE_ARGS:
@@ -117,11 +213,21 @@ class PexipNode(PexipClient):
     """ A Pexip Transcoder Node. """
 
     def create(self):
+        """ Create the node's configuration within the Manager, then bootstrap the node. """
+        content = self.configure()
+        self._provision(content)
+
+    def configure(self):
+        """Create the node's configuration within the Manager and return the BootstrapPayload
+        holding the bootstrap XML document generated for it."""
         # Validate input data before POSTing config to manager
-        self._sanity_check()
+        with tracing.span("node.validate", node=self.args.hostname):
+            self._sanity_check()
+        self._record(journal.VALIDATED)
 
-        tls_cert_path = self._get_tls_config(self.args.tls_certificate_subject_name)
-        system_location_path = self._get_system_location_id(self.args.system_location_name)
+        with tracing.span("node.lookups", node=self.args.hostname):
+            tls_cert_path = self._get_tls_config(self.args.tls_certificate_subject_name)
+            system_location_path = self._get_system_location_id(self.args.system_location_name)
 
         data = {
             "name": self.args.hostname,
@@ -136,8 +242,10 @@ class PexipNode(PexipClient):
             "system_location": system_location_path,
         }
 
-        response = self.client.post(
+        response = self._request(
+            "post",
             f"{self.url}/{self.routes['node']}",
+            endpoint="node",
             stream=True,
             data=json.dumps({**data, **DEFAULT_CREATE_DATA}),
         )
@@ -145,11 +253,84 @@ class PexipNode(PexipClient):
         if not response.ok:
             # TODO: if debug print(data) ?
             self._log_error(response.status_code, response.content)
-            sys.exit(1)
+            raise NodeCreationError(
+                f"Manager rejected configuration for {self.args.hostname}. "
+                f"Status code: {response.status_code}."
+            )
 
         # TODO: Logging
         print(f"Successfully created configuration for {self.args.hostname}")
-        self._provision(response.content)
+        self._record(journal.CREATED)
+        # The Manager answers with the new object's URI, e.g. '.../worker_vm/12/'.
+        location = response.headers.get("Location", "").rstrip("/")
+        if location.rpartition("/")[2].isdigit():
+            data["id"] = int(location.rpartition("/")[2])
+        if self.cache:
+            self.cache.add(self, "node", data)
+        # Stream the XML to disk once: the journal's copy when there is one, else a temp file.
+        path = self.journal.xml_path(self.args.hostname) if self.journal else None
+        content = BootstrapPayload.from_response(response, path)
+        self._record(journal.XML_RECEIVED)
+        return content
+
+    def delete(self, node=None, active_nodes=None):
+        """Delete the node's configuration from the Manager. 'node' is its 'worker_vm' object
+        if already resolved, otherwise it is looked up by hostname. If 'active_nodes' (a set of
+        node addresses currently hosting participants) is passed, busy nodes are left alone."""
+        node = node or self._lookup("node", key="name", val=self.args.hostname)
+        if node and "id" not in node:
+            # Created by this run without its id being known, so ask the Manager for it.
+            node = self._query("node", key="name", val=self.args.hostname)
+        if not node:
+            raise TranscoderNotFound(
+                f"Transcoder Node {self.args.hostname} does not exist. Nothing to do."
+            )
+        if active_nodes is not None and node.get("address") in active_nodes:
+            raise TranscoderInUse(
+                f"Transcoder Node {self.args.hostname} is hosting active calls. Skipping."
+            )
+
+        response = self._request(
+            "delete", f"{self.url}{self.routes['node']}{node['id']}/", endpoint="node"
+        )
+        if not response.ok:
+            self._log_error(response.status_code, response.content)
+            raise NodeDeletionError(
+                f"Manager refused to delete {self.args.hostname}. "
+                f"Status code: {response.status_code}."
+            )
+
+        print(f"Successfully deleted configuration for {self.args.hostname}")
+        if self.cache:
+            self.cache.remove(self, "node", node)
+
+    def provision(self, content, pipeline) -> Future:
+        """Queue the node to be bootstrapped by 'pipeline'. The returned Future resolves once
+        the node is bootstrapped, or raises ProvisioningError after spooling its XML.
+        'content' is the XML document, or the BootstrapPayload holding it."""
+        print(f"Attempting to provision the node {self.args.hostname} at {self.args.private_ip}")
+        done = Future()
+
+        def _provisioned(future):
+            error = future.exception()
+            if error:
+                print(f"Error when attempting to provision node: {self.args.hostname}. {error}")
+                try:
+                    self._error_and_write_xml(content)
+                except Exception as e:
+                    done.set_exception(e)
+            else:
+                print(f"Success: {self.args.hostname} {future.result().status_code} status code.")
+                self._record(journal.BOOTSTRAPPED)
+                done.set_result(future.result())
+            # Kept by the spool or journal if still needed, a temporary copy is now done with.
+            if isinstance(content, BootstrapPayload):
+                content.discard()
+
+        pipeline.submit(self.args.hostname, self.args.private_ip, content).add_done_callback(
+            _provisioned
+        )
+        return done
 
     def _provision(self, content, hostname=None):
         # Set hostname if not passed
@@ -158,72 +339,64 @@ class PexipNode(PexipClient):
 
         start_time = time.time()
         try:
-            # Supress warnings, we realize this is a self-signed certificate.
-            requests.packages.urllib3.disable_warnings()
-            print(f"Attempting to provision the node {hostname} at {self.args.private_ip}")
-            # Send request, wait up to 5s (timeout=5) for a response.
-            # NOTE: This will not wait the full 5s if the host response with an error after, 2 seconds
-            # NOTE: This is a freshly stood up node, it will have a self-signed certificate. Verify MUST be false.
-            response = requests_retry_session().post(
-                f"https://{self.args.private_ip}:8443/configuration/bootstrap",
-                verify=False,
-                headers={"Content-Type": "text/xml"},
-                data=content,
-                timeout=5,
-            )
-        except ConnectTimeout as e:
-            print(f"Connection timed out when attempting to provision node: {hostname}. Error: {e}")
-            self._error_and_write_xml(content)
-        except Exception as e:
-            print(f"Unknown error when attempting to provision node: {hostname}. Error: {e}")
-            self._error_and_write_xml(content)
-        else:
-            if response.ok:
-                print(f"Success: {response.status_code} status code.")
-            else:
-                print(
-                    f"Error in response returned when provisioning node. Status code: {response.status_code}. Response Content: {response.content}."
-                )
-                self._error_and_write_xml(content)
+            pipeline = BootstrapPipeline.from_args(self.args, parallel=1, context=self.context)
+            with pipeline:
+                self.provision(content, pipeline).result()
         finally:
             end_time = time.time()
             print(f"Total time {end_time - start_time}")
 
-    def _error_and_write_xml(self, content):
-        with open(f"{self.args.hostname}.xml", "wb") as xml_file:
-            print(f"Writing {self.args.hostname}.xml config to disk for retry.")
-            xml_file.write(content)
-
-        sys.exit(1)
+    def _record(self, phase, content=None):
+        """ Record a completed phase within the run's journal, if there is one. """
+        if self.journal:
+            self.journal.record(self.args.hostname, phase, content)
 
+    def _error_and_write_xml(self, content):
+        """ Enqueue the node's bootstrap XML to the spool, to be retried by 'bootstrap --spool'. """
+        spool = Spool(self.args.spool_dir)
+        entry = spool.enqueue(self.args.hostname, self.args.private_ip, content)
+        print(f"Spooled {entry.xml_path} for retry with 'pexip bootstrap --spool'.")
+
+        raise ProvisioningError(f"Unable to provision node {self.args.hostname}.")
+
+
+def drain_spool(spool, pipeline):
+    """Bootstrap every node pending in 'spool' concurrently through 'pipeline', which retries
+    each until it succeeds or reaches its deadline, and is closed once all have finished.
+    Bootstrapped entries are removed, failed ones stay for the next drain.
+    Returns a dictionary of hostname -> error (None on success)."""
+    results = {}
+    with pipeline:
+        futures = {}
+        for entry in spool.entries():
+            print(f"Attempting to provision the node {entry.hostname} at {entry.address}")
+            futures[entry] = pipeline.submit(entry.hostname, entry.address, entry.payload())
+
+    for entry, future in futures.items():
+        error = future.exception()
+        results[entry.hostname] = error
+        if error:
+            print(f"Error when attempting to provision node: {entry.hostname}. {error}")
+            entry.attempts += 1
+            spool.update(entry)
+        else:
+            print(f"Success: {entry.hostname} {future.result().status_code} status code.")
+            spool.remove(entry)
+    return results
 
-# TODO: Merge this into PexipNode._provision for DRY.
-def provision(content, hostname):
 
+def provision(content, hostname, args=None):
+    """ Bootstrap a single node at 'hostname' with 'content'. """
     start_time = time.time()
+    print(f"Attempting to provision the node {hostname}")
     try:
-        print(f"Attempting to provision the node {hostname}")
-        # Send request, wait up to 5s (timeout=5) for a response.
-        # NOTE: This will not wait the full 5s if the host response with an error after, 2 seconds
-        # NOTE: This is a freshly stood up node, it will have a self-signed certificate. Verify MUST be false.
-        response = requests_retry_session().post(
-            f"https://{hostname}:8443/configuration/bootstrap",
-            verify=False,
-            headers={"Content-Type": "text/xml"},
-            data=content,
-            timeout=5,
-        )
-    except ConnectTimeout as e:
-        print(f"Connection timed out when attempting to provision node: {hostname}. Error: {e}")
-    except Exception as e:
-        print(f"Unknown error when attempting to provision node: {hostname}. Error: {e}")
+        with BootstrapPipeline.from_args(args or NodeSpec(), parallel=1) as pipeline:
+            response = pipeline.submit(hostname, hostname, content).result()
+    except ProvisioningError as e:
+        print(f"Error when attempting to provision node: {hostname}. {e}")
+        raise
     else:
-        if response.ok:
-            print(f"Success: {response.status_code} status code.")
-        else:
-            print(
-                f"Error in response returned when provisioning node. Status code: {response.status_code}. Response Content: {response.content}."
-            )
+        print(f"Success: {response.status_code} status code.")
     finally:
         end_time = time.time()
         print(f"Total time {end_time - start_time}")
@@ -233,25 +406,3 @@ class PexipManager(PexipConnection):
     """Class for controlling the Pexip Manager configuration.  """
 
     pass
-
-
-class DataObject(dict):
-    """ Simple object for dot walking """
-
-    def __init__(self, *args, **kwargs):
-        self.update(*args, **kwargs)
-
-    def __getattr__(self, attr):
-        return self.get(attr)
-
-    def __setattr__(self, key, value):
-        self.__setitem__(key, value)
-
-    def __setitem__(self, key, value):
-        self.__dict__.update({key: value})
-
-    def __delattr__(self, item):
-        self.__delitem__(item)
-
-    def __delitem__(self, key):
-        del self.__dict__[key]
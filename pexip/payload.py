@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+
+from contextlib import nullcontext
+from pathlib import Path
+
+# Bytes of a Manager response written to disk at a time.
+CHUNK_SIZE = 64 * 1024
+
+
+class BootstrapPayload:
+    """A node's bootstrap XML, kept in a single file rather than in memory.
+
+    The Manager's response is streamed to the file once. Every bootstrap attempt then
+    streams the file to the node, and persisting a failed node links (or copies) the file,
+    so no attempt holds the document in memory. 'temporary' payloads are deleted by
+    'discard' once they are no longer needed.
+    """
+
+    def __init__(self, path, temporary=False):
+        self.path = Path(path)
+        self.temporary = temporary
+
+    @classmethod
+    def from_response(cls, response, path=None, chunk_size=CHUNK_SIZE):
+        """Stream the body of a (stream=True) response to 'path', or to a temporary file.
+        The file is written under another name and moved into place once complete. It holds
+        the node's password, so only the current user may read it."""
+        temporary = path is None
+        if temporary:
+            fd, path = tempfile.mkstemp(prefix="pexip-", suffix=".xml")
+            os.close(fd)
+        path = Path(path)
+        partial = path.with_name(f"{path.name}.tmp")
+        fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_content(chunk_size):
+                f.write(chunk)
+        os.replace(partial, path)
+        return cls(path, temporary=temporary)
+
+    def open(self):
+        return self.path.open("rb")
+
+    def read(self) -> bytes:
+        return self.path.read_bytes()
+
+    def save(self, destination):
+        """ Persist the payload at 'destination', hard linking it when possible. """
+        destination = Path(destination)
+        if destination.exists():
+            destination.unlink()
+        try:
+            os.link(self.path, destination)
+        except OSError:
+            shutil.copy(self.path, destination)
+
+    def discard(self):
+        """ Delete a temporary payload. """
+        if self.temporary:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __repr__(self):
+        return f"BootstrapPayload({str(self.path)!r})"
+
+
+def open_body(content):
+    """ A request body for 'content', either bytes or a BootstrapPayload streamed from disk. """
+    if isinstance(content, BootstrapPayload):
+        return content.open()
+    return nullcontext(content)
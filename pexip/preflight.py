@@ -0,0 +1,77 @@
+import ipaddress
+
+from .cli.definitions import REQUIRED_CREATE_ARGS
+
+# Node fields holding an address which must be unique across the whole batch.
+ADDRESS_FIELDS = ["private_ip", "public_ip"]
+
+
+def _gateway_problem(node):
+    """ Why a node's gateway is unusable within the subnet of its private address, if it is. """
+    try:
+        ipaddress.ip_address(node.private_ip)
+    except ValueError:
+        # Already reported as an invalid private_ip.
+        return None
+    try:
+        network = ipaddress.ip_interface(f"{node.private_ip}/{node.netmask}").network
+    except ValueError:
+        return f"invalid netmask {node.netmask!r}"
+    try:
+        gateway = ipaddress.ip_address(node.gateway)
+    except ValueError:
+        return f"invalid gateway {node.gateway!r}"
+    if gateway not in network:
+        return f"gateway {node.gateway} is outside {network}"
+    return None
+
+
+def preflight(nodes) -> list:
+    """Validate a whole batch of nodes before anything is sent to the Manager.
+
+    Every node is checked in one pass, against indexes of the hostnames and addresses of
+    the nodes before it, for: missing required fields, duplicate hostnames, invalid or
+    colliding private/public addresses, and gateways outside the subnet given by the
+    private address and netmask.
+    Returns a list of (hostname, problem), empty when the batch is valid.
+    """
+    problems = []
+    hostnames = {}
+    addresses = {}
+    for position, node in enumerate(nodes, 1):
+        name = node.hostname or f"node #{position}"
+        missing = [arg for arg in REQUIRED_CREATE_ARGS if not getattr(node, arg)]
+        if missing:
+            problems.append((name, f"missing {', '.join(missing)}"))
+
+        if node.hostname:
+            if node.hostname in hostnames:
+                first = hostnames[node.hostname]
+                problems.append((name, f"duplicate hostname, also node #{first}"))
+            else:
+                hostnames[node.hostname] = position
+
+        for field in ADDRESS_FIELDS:
+            value = getattr(node, field)
+            if not value:
+                continue
+            try:
+                address = ipaddress.ip_address(value)
+            except ValueError:
+                problems.append((name, f"invalid {field} {value!r}"))
+                continue
+            owner = addresses.setdefault(address, name)
+            if owner != name:
+                problems.append((name, f"{field} {value} is already used by {owner}"))
+
+        if node.private_ip and node.netmask and node.gateway:
+            problem = _gateway_problem(node)
+            if problem:
+                problems.append((name, problem))
+    return problems
+
+
+def print_problems(problems):
+    print(f"Preflight: {len(problems)} problems found, nothing was sent to the Manager.")
+    for hostname, problem in problems:
+        print(f"  ! {hostname}: {problem}")
@@ -0,0 +1,217 @@
+import heapq
+import random
+import socket
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+from . import metrics, tracing
+from .exceptions import ProvisioningError
+from .payload import open_body
+from .definitions import (
+    BOOTSTRAP_PORT,
+    BOOTSTRAP_URL,
+    BOOTSTRAP_RETRY_STATUSES,
+    DEFAULT_BOOTSTRAP_DEADLINE,
+    DEFAULT_BOOTSTRAP_PARALLEL,
+    DEFAULT_BOOTSTRAP_POLL_INTERVAL,
+)
+
+
+def is_reachable(address, port=BOOTSTRAP_PORT, timeout=2) -> bool:
+    """ A cheap readiness check, can a TCP connection be opened to address:port? """
+    try:
+        with socket.create_connection((address, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class BootstrapJob:
+    """ A single node waiting to be bootstrapped by a BootstrapPipeline. """
+
+    def __init__(self, hostname, address, content, deadline):
+        self.hostname = hostname
+        self.address = address
+        self.content = content
+        self.started = time.time()
+        self.deadline = self.started + deadline
+        self.trace_start = time.perf_counter()
+        self.attempts = 0
+        self.last_error = None
+        self.future = Future()
+
+
+class BootstrapPipeline:
+    """Bootstraps many freshly launched nodes concurrently.
+
+    Every submitted node is polled with a cheap TCP check against its bootstrap port, with a
+    jittered interval, and its bootstrap XML is POSTed as soon as the port is reachable.
+    Worker threads are only held while a probe or POST is in flight, never while a node
+    is waiting for its next poll, so a batch takes as long as its slowest node.
+    Each node gives up once its 'deadline' (in seconds) has passed.
+    """
+
+    def __init__(
+        self,
+        parallel=DEFAULT_BOOTSTRAP_PARALLEL,
+        deadline=DEFAULT_BOOTSTRAP_DEADLINE,
+        poll_interval=DEFAULT_BOOTSTRAP_POLL_INTERVAL,
+        url=BOOTSTRAP_URL,
+        port=BOOTSTRAP_PORT,
+        session=None,
+    ):
+        self.deadline = deadline
+        self.poll_interval = poll_interval
+        self.url = url
+        self.port = port
+
+        # NOTE: This is a freshly stood up node, it will have a self-signed certificate.
+        # Verify MUST be false, so supress the warnings as well.
+        requests.packages.urllib3.disable_warnings()
+        self.session = session or metrics.instrument(requests.Session())
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, parallel))
+        self._queue = []  # heap of (next attempt time, sequence, job)
+        self._sequence = 0
+        self._pending = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._scheduler = threading.Thread(target=self._schedule_loop, daemon=True)
+        self._scheduler.start()
+
+    @classmethod
+    def from_args(cls, args, parallel=DEFAULT_BOOTSTRAP_PARALLEL, context=None):
+        """Build a BootstrapPipeline from the CLI arguments, sharing the bootstrap connection
+        pool of 'context' when one is passed."""
+        return cls(
+            parallel=args.bootstrap_parallel or parallel,
+            deadline=args.bootstrap_deadline or DEFAULT_BOOTSTRAP_DEADLINE,
+            session=context.bootstrap_session() if context else None,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, hostname, address, content) -> Future:
+        """Queue a node to be bootstrapped. Returns a Future which resolves to the bootstrap
+        response, or raises ProvisioningError once the node's deadline has passed."""
+        job = BootstrapJob(hostname, address, content, self.deadline)
+        with self._cond:
+            self._pending += 1
+        self._schedule(job, delay=0)
+        return job.future
+
+    def close(self):
+        """ Wait for every submitted node to finish, then release the worker threads. """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            while self._pending:
+                self._cond.wait()
+        self._scheduler.join()
+        self._executor.shutdown()
+
+    def _schedule(self, job, delay):
+        with self._cond:
+            heapq.heappush(self._queue, (time.time() + delay, self._sequence, job))
+            self._sequence += 1
+            self._cond.notify_all()
+
+    def _schedule_loop(self):
+        """ Hand each job to a worker thread once its next attempt is due. """
+        with self._cond:
+            while True:
+                if not self._queue:
+                    if self._closed and not self._pending:
+                        return
+                    self._cond.wait()
+                    continue
+                due, _, job = self._queue[0]
+                now = time.time()
+                if due > now:
+                    self._cond.wait(timeout=due - now)
+                    continue
+                heapq.heappop(self._queue)
+                self._executor.submit(self._attempt, job)
+
+    def _finish(self, job, result=None, error=None):
+        tracing.record(
+            "bootstrap.node",
+            job.trace_start,
+            time.perf_counter(),
+            node=job.hostname,
+            attempts=job.attempts,
+            ok=error is None,
+        )
+        if error:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+        with self._cond:
+            self._pending -= 1
+            self._cond.notify_all()
+
+    def _retry(self, job, error):
+        """ Poll the node again after a jittered interval, unless its deadline has passed. """
+        job.last_error = error
+        metrics.inc("pexip_bootstrap_retries")
+        remaining = job.deadline - time.time()
+        if remaining <= 0:
+            self._finish(
+                job,
+                error=ProvisioningError(
+                    f"Unable to bootstrap node {job.hostname} at {job.address} within "
+                    f"{self.deadline}s after {job.attempts} attempts. Last error: {error}"
+                ),
+            )
+            return
+        delay = self.poll_interval * random.uniform(0.5, 1.5)
+        self._schedule(job, delay=min(delay, remaining))
+
+    def _attempt(self, job):
+        try:
+            with tracing.span("bootstrap.probe", node=job.hostname) as span:
+                span["reachable"] = is_reachable(job.address, self.port)
+            if not span["reachable"]:
+                self._retry(job, f"Port {self.port} is not reachable yet.")
+                return
+
+            job.attempts += 1
+            url = self.url.format(address=job.address, port=self.port)
+            if job.attempts > 1:
+                metrics.retried(url)
+            with open_body(job.content) as body, tracing.span(
+                "bootstrap.post", node=job.hostname, attempt=job.attempts
+            ):
+                response = self.session.post(
+                    url,
+                    verify=False,
+                    headers={"Content-Type": "text/xml"},
+                    data=body,
+                    timeout=5,
+                )
+        except requests.exceptions.RequestException as e:
+            self._retry(job, e)
+        except Exception as e:
+            self._finish(job, error=ProvisioningError(f"Unable to bootstrap {job.hostname}: {e}"))
+        else:
+            if response.ok:
+                self._finish(job, result=response)
+            elif response.status_code in BOOTSTRAP_RETRY_STATUSES:
+                self._retry(job, f"Status code: {response.status_code}")
+            else:
+                self._finish(
+                    job,
+                    error=ProvisioningError(
+                        f"Error in response returned when provisioning node {job.hostname}. "
+                        f"Status code: {response.status_code}. "
+                        f"Response Content: {response.content}."
+                    ),
+                )
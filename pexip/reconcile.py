@@ -0,0 +1,123 @@
+from .cli.definitions import REQUIRED_CREATE_ARGS
+from .definitions import API_MAP
+from .data import NodeSpec
+
+# Fields of a 'worker_vm' compared against the desired node, as (worker_vm field, node field).
+COMPARED_FIELDS = [
+    ("address", "private_ip"),
+    ("static_nat_address", "public_ip"),
+    ("netmask", "netmask"),
+    ("gateway", "gateway"),
+    ("domain", "domain"),
+]
+
+
+class Plan:
+    """The difference between a desired set of nodes and the Manager's current state.
+
+    to_create - desired nodes missing from the Manager
+    to_delete - (node, worker_vm) pairs found in the Manager but not desired (with 'prune')
+    unchanged - hostnames of desired nodes already configured as requested
+    drifted   - (hostname, [differences]) of desired nodes configured differently. These are
+                reported, but left alone, as replacing a live node is never done implicitly.
+    invalid   - (hostname, reason) of desired nodes that could not be created as given
+    """
+
+    def __init__(self):
+        self.to_create = []
+        self.to_delete = []
+        self.unchanged = []
+        self.drifted = []
+        self.invalid = []
+
+    @property
+    def empty(self) -> bool:
+        return not (self.to_create or self.to_delete)
+
+    def print(self):
+        print(
+            f"Plan: {len(self.to_create)} to create, {len(self.to_delete)} to delete, "
+            f"{len(self.unchanged)} unchanged, {len(self.drifted)} drifted, "
+            f"{len(self.invalid)} invalid."
+        )
+        for node in self.to_create:
+            print(f"  + {node.hostname}")
+        for node, _ in self.to_delete:
+            print(f"  - {node.hostname}")
+        for hostname, differences in self.drifted:
+            print(f"  ~ {hostname}: {', '.join(differences)}")
+        for hostname, reason in self.invalid:
+            print(f"  ! {hostname}: {reason}")
+
+
+def _location_path(location):
+    return f"{API_MAP['system_location']}{location['id']}/"
+
+
+def _with_hostname(node, hostname) -> NodeSpec:
+    """ The CLI data of 'node', for another hostname. """
+    return NodeSpec(node, hostname=hostname)
+
+
+def compute_plan(desired, client, prune=False) -> Plan:
+    """Compare 'desired' nodes against the Manager's state and return a Plan.
+
+    The 'worker_vm', 'system_location' and 'tls_certificate' listings are each fetched once,
+    through the client's lookup cache, and everything else is decided from those indexes.
+    Applying the Plan afterwards re-uses the same indexes, so an unchanged fleet costs only
+    the listing requests.
+    """
+    cache = client.cache
+    nodes = cache.index(client, "node", "name")
+    locations = cache.index(client, "system_location", "name")
+    certificates = cache.index(client, "tls_cert", "subject_name")
+
+    plan = Plan()
+    desired_hostnames = set()
+    desired_locations = set()
+    for node in desired:
+        if node.hostname in desired_hostnames:
+            plan.invalid.append((node.hostname, "duplicate hostname"))
+            continue
+        desired_hostnames.add(node.hostname)
+        location = locations.get(node.system_location_name)
+        if location:
+            desired_locations.add(_location_path(location))
+
+        existing = nodes.get(node.hostname)
+        if existing:
+            differences = [
+                f"{field} {existing.get(field)!r} != {getattr(node, arg)!r}"
+                for field, arg in COMPARED_FIELDS
+                if getattr(node, arg) and existing.get(field) != getattr(node, arg)
+            ]
+            if location and existing.get("system_location") != _location_path(location):
+                differences.append(f"system_location != {node.system_location_name!r}")
+            if differences:
+                plan.drifted.append((node.hostname, differences))
+            else:
+                plan.unchanged.append(node.hostname)
+            continue
+
+        missing = [arg for arg in REQUIRED_CREATE_ARGS if not getattr(node, arg)]
+        if missing:
+            plan.invalid.append((node.hostname, f"missing {', '.join(missing)}"))
+        elif not location:
+            plan.invalid.append(
+                (node.hostname, f"unknown system location {node.system_location_name!r}")
+            )
+        elif node.tls_certificate_subject_name not in certificates:
+            plan.invalid.append(
+                (node.hostname, f"unknown TLS certificate {node.tls_certificate_subject_name!r}")
+            )
+        else:
+            plan.to_create.append(node)
+
+    if prune:
+        for hostname, existing in nodes.items():
+            if hostname is None or hostname in desired_hostnames:
+                continue
+            if existing.get("system_location") in desired_locations:
+                plan.to_delete.append((_with_hostname(client.args, hostname), existing))
+
+    return plan
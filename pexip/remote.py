@@ -0,0 +1,140 @@
+"""
+The thin client of 'pexip serve'. Forwards a parsed command to a running daemon over HTTP
+or a Unix socket, using only the standard library so that the CLI stays quick to start.
+"""
+import os
+import json
+import base64
+import socket
+
+from collections.abc import Iterator
+from http.client import HTTPConnection, HTTPException
+from pathlib import Path
+from urllib.parse import urlparse
+
+from .config import get_default_data_dir
+from .definitions import DEFAULT_SERVE_PORT
+from .exceptions import ServeUnavailable
+
+# Actions forwarded to a daemon, see 'pexip.serve.SERVE_ACTIONS'.
+FORWARDED_ACTIONS = ["create", "delete", "bootstrap"]
+
+# Options naming files or directories. The daemon only uses its own, so they aren't sent.
+LOCAL_OPTIONS = ["xml_file", "spool_dir", "cache_dir", "snapshot", "journal", "inventory"]
+
+ENV_SERVER_TOKEN = "PEXIP_SERVER_TOKEN"
+
+# Seconds to wait for a daemon to accept a connection. Commands may then take minutes.
+CONNECT_TIMEOUT = 1
+
+_JSON_TYPES = (str, int, float, bool, type(None), list, dict)
+
+
+def get_default_socket_path() -> Path:
+    return get_default_data_dir() / "serve.sock"
+
+
+def get_default_token_path() -> Path:
+    return get_default_data_dir() / "serve.token"
+
+
+def _token():
+    """ The token of a daemon listening on a port, from the environment or its token file. """
+    token = os.environ.get(ENV_SERVER_TOKEN)
+    if token:
+        return token
+    try:
+        return get_default_token_path().read_text().strip()
+    except OSError:
+        return None
+
+
+class _UnixConnection(HTTPConnection):
+    """ An HTTPConnection over a Unix socket. """
+
+    def __init__(self, socket_path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _connect(server) -> HTTPConnection:
+    """ Connect to the daemon at 'server': 'unix:<path>' or 'http://<host>[:<port>]'. """
+    if server.startswith("unix:"):
+        connection = _UnixConnection(server[len("unix:") :], timeout=CONNECT_TIMEOUT)
+    else:
+        url = urlparse(server)
+        connection = HTTPConnection(
+            url.hostname, url.port or DEFAULT_SERVE_PORT, timeout=CONNECT_TIMEOUT
+        )
+    try:
+        connection.connect()
+    except OSError as e:
+        raise ServeUnavailable(f"No 'pexip serve' daemon is listening at {server}. {e}")
+    connection.sock.settimeout(None)
+    return connection
+
+
+def _options(options) -> dict:
+    return {
+        k: v
+        for k, v in options.items()
+        if k not in LOCAL_OPTIONS and isinstance(v, _JSON_TYPES)
+    }
+
+
+def forwardable(action, data, options) -> bool:
+    """Whether a command can be run by a daemon. Journaled runs, spool drains and runs
+    against several Managers keep local state, so always run within the CLI, as do
+    incomplete bootstraps so that they are reported as usual."""
+    if action == "bootstrap" and not (options.xml_file and options.node_address):
+        return False
+    return (
+        action in FORWARDED_ACTIONS
+        and not isinstance(data, dict)
+        and not getattr(options, "journal", None)
+        and not getattr(options, "spool", False)
+    )
+
+
+def send(server, action, data, options) -> dict:
+    """Run a parsed command ('data' of 'action', with the global 'options') on the daemon
+    at 'server', returning its response. Raises ServeUnavailable, before any node record
+    is read, when no daemon is listening."""
+    xml = None
+    if action == "bootstrap":
+        # The daemon never reads files named by a request, so send it the XML itself.
+        try:
+            xml = base64.b64encode(Path(options.xml_file).read_bytes()).decode()
+        except OSError as e:
+            return {"error": f"Unable to read {options.xml_file}. {e}", "exit": 1}
+
+    connection = _connect(server)
+    if isinstance(data, (list, Iterator)):
+        body = {
+            "options": _options(vars(options)),
+            "nodes": [_options(node.own_options()) for node in data],
+        }
+    else:
+        body = {"options": _options(vars(data)), "nodes": None}
+    if xml is not None:
+        body["xml"] = xml
+    headers = {"Content-Type": "application/json"}
+    token = _token()
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        connection.request("POST", f"/v1/{action}", body=json.dumps(body), headers=headers)
+        response = connection.getresponse()
+        content = json.loads(response.read())
+    except (OSError, HTTPException, ValueError) as e:
+        return {"error": f"The 'pexip serve' daemon at {server} failed. {e}", "exit": 1}
+    finally:
+        connection.close()
+    if response.status != 200:
+        return {"error": content.get("error"), "exit": 1}
+    return content
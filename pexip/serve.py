@@ -0,0 +1,242 @@
+"""
+The 'pexip serve' daemon. It keeps Manager sessions, lookup listings and the node and
+bootstrap worker pools warm between the commands forwarded to it by 'pexip --server'.
+"""
+import os
+import hmac
+import json
+import time
+import base64
+import secrets
+import threading
+
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+from . import tracing
+from .context import RunContext
+from .core import (
+    BOOTSTRAPPED,
+    CREATED,
+    FAILED,
+    PROVISIONING,
+    create_node,
+    delete_batch,
+)
+from .data import NodeSpec
+from .definitions import DEFAULT_SERVE_CACHE_REFRESH, DEFAULT_SERVE_PARALLEL
+from .exceptions import ManagerRequestError
+from .models import PexipClient
+from .preflight import preflight
+from .provision import BootstrapPipeline
+from .remote import LOCAL_OPTIONS
+
+# Actions a 'pexip serve' daemon runs on behalf of the CLI, at 'POST /v1/<action>'.
+SERVE_ACTIONS = ["create", "delete", "bootstrap"]
+
+
+class Daemon:
+    """Runs forwarded commands against one warm RunContext and BootstrapPipeline.
+
+    Every request shares the same Manager sessions (one per set of credentials), limiters
+    (one per Manager) and lookup listings, which are fetched again every 'cache_refresh'
+    seconds so that changes made outside the daemon are picked up. Nodes are worked on by
+    a single pool of 'parallel' workers, shared by every request.
+    A request is a JSON object of the global 'options' and, for batches, the 'nodes' set
+    over them. The response holds each node's 'results' and the 'exit' status of the run.
+    Options naming local files ('LOCAL_OPTIONS') are never taken from a request, those of
+    the daemon's own arguments ('local_options') are used instead.
+    """
+
+    def __init__(
+        self,
+        context,
+        pipeline,
+        parallel=DEFAULT_SERVE_PARALLEL,
+        cache_refresh=DEFAULT_SERVE_CACHE_REFRESH,
+        local_options=None,
+    ):
+        self.context = context
+        self.pipeline = pipeline
+        self.cache_refresh = cache_refresh
+        self.local_options = {name: None for name in LOCAL_OPTIONS}
+        self.local_options.update(local_options or {})
+        self._executor = ThreadPoolExecutor(max_workers=max(1, parallel))
+        self._refreshed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, args):
+        context = RunContext.from_args(args, batch=True)
+        return cls(
+            context,
+            BootstrapPipeline.from_args(args, context=context),
+            parallel=args.parallel,
+            cache_refresh=args.cache_refresh,
+            local_options={name: getattr(args, name, None) for name in LOCAL_OPTIONS},
+        )
+
+    def close(self):
+        self._executor.shutdown()
+        self.pipeline.close()
+        self.context.close()
+
+    def _refresh(self):
+        with self._lock:
+            if time.monotonic() - self._refreshed_at < self.cache_refresh:
+                return
+            self._refreshed_at = time.monotonic()
+        self.context.cache.clear()
+
+    def handle(self, action, request) -> dict:
+        # Options the CLI did not send read as None, as they would for a NodeSpec.
+        options = NodeSpec(Namespace(**{**request["options"], **self.local_options}))
+        nodes = request.get("nodes")
+        if nodes is None:
+            nodes = [options]
+        else:
+            nodes = [NodeSpec(options, **self._remote(node)) for node in nodes]
+        self._refresh()
+        try:
+            with tracing.span(f"serve.{action}"):
+                response = getattr(self, action)(options, nodes, request)
+        except ManagerRequestError as e:
+            print(e)
+            return {"error": str(e), "exit": 1}
+        if "results" in response:
+            results = response["results"]
+            failed = any(outcome == FAILED for outcome, _ in results.values())
+            response["results"] = {
+                hostname: [outcome, str(error) if error else None]
+                for hostname, (outcome, error) in results.items()
+            }
+            response["exit"] = 1 if failed else 0
+        return response
+
+    @staticmethod
+    def _remote(options) -> dict:
+        return {k: v for k, v in options.items() if k not in LOCAL_OPTIONS}
+
+    def create(self, options, nodes, request) -> dict:
+        if not options.no_preflight:
+            problems = preflight(nodes)
+            if problems:
+                return {"problems": problems, "exit": 1}
+        futures = {
+            node.hostname: self._executor.submit(create_node, node, self.context, self.pipeline)
+            for node in nodes
+        }
+        results = {}
+        for hostname, future in futures.items():
+            outcome, value = future.result()
+            if outcome == PROVISIONING:
+                error = value.exception()
+                outcome, value = (FAILED, error) if error else (CREATED, None)
+            results[hostname] = (outcome, value)
+        return {"results": results}
+
+    def delete(self, options, nodes, request) -> dict:
+        results = delete_batch(
+            nodes,
+            PexipClient(options, context=self.context),
+            parallel=options.parallel or 1,
+            context=self.context,
+            check_active_calls=options.check_active_calls,
+        )
+        return {"results": results}
+
+    def bootstrap(self, options, nodes, request) -> dict:
+        address = options.node_address
+        content = base64.b64decode(request.get("xml") or "")
+        print(f"Attempting to provision the node {address}")
+        bootstrap = self.pipeline.submit(address, address, content)
+        error = bootstrap.exception()
+        if error:
+            print(f"Error when attempting to provision node: {address}. {error}")
+        return {"results": {address: (FAILED, error) if error else (BOOTSTRAPPED, None)}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _refused(self):
+        """Why a request is refused, if it is: it must be JSON, not sent by a web browser,
+        and carry the daemon's token when it has one."""
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type != "application/json":
+            return 415, "Requests must be 'application/json'."
+        if self.headers.get("Origin") is not None:
+            return 403, "Requests from web pages are not accepted."
+        token = self.server.token
+        if token is not None:
+            scheme, _, given = self.headers.get("Authorization", "").partition(" ")
+            if scheme != "Bearer" or not hmac.compare_digest(given.encode(), token.encode()):
+                return 401, "A valid token is required."
+        return None
+
+    def _respond(self, status, body):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if self.path != "/v1/health":
+            return self._respond(404, {"error": f"Unknown path {self.path}"})
+        self._respond(200, {"actions": SERVE_ACTIONS})
+
+    def do_POST(self):
+        action = self.path.rpartition("/v1/")[2]
+        if action not in SERVE_ACTIONS:
+            return self._respond(404, {"error": f"Unknown action {action!r}"})
+        refused = self._refused()
+        if refused:
+            return self._respond(refused[0], {"error": refused[1]})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError as e:
+            return self._respond(400, {"error": f"Invalid request. {e}"})
+        try:
+            response = self.server.daemon.handle(action, request)
+        except Exception as e:
+            print(f"Error: Failed to {action}. {e}")
+            return self._respond(500, {"error": f"Failed to {action}. {e}"})
+        self._respond(200, response)
+
+
+class _UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # Unix sockets have no client address, which BaseHTTPRequestHandler logs.
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def make_server(daemon, socket_path=None, host=None, port=None, token=None):
+    """An HTTP server for 'daemon', on a Unix socket only the user can use, or on host:port.
+    A server on a port requires every request to carry 'token', a new one if not given."""
+    if port is None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        umask = os.umask(0o177)
+        try:
+            server = _UnixHTTPServer(str(socket_path), _Handler)
+        finally:
+            os.umask(umask)
+        server.token = token
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.token = token or secrets.token_urlsafe(32)
+    server.daemon = daemon
+    return server
+
+
+def write_token(token, path):
+    """ Write 'token' to 'path', readable only by the current user. """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
@@ -0,0 +1,62 @@
+import gzip
+import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .definitions import API_MAP, DEFAULT_SNAPSHOT_PARALLEL
+
+
+class Snapshot:
+    """A point-in-time copy of every Manager listing within 'API_MAP'.
+
+    'objects' maps each endpoint to its full listing. Endpoints which could not be listed
+    are left out of 'objects', with the reason within 'errors'.
+    """
+
+    def __init__(self, manager_url=None, taken_at=None, objects=None, errors=None):
+        self.manager_url = manager_url
+        self.taken_at = taken_at or time.time()
+        self.objects = objects or {}
+        self.errors = errors or {}
+
+    @classmethod
+    def take(cls, client, endpoints=None, parallel=DEFAULT_SNAPSHOT_PARALLEL):
+        """ Fetch every page of each endpoint's listing, 'parallel' listings at a time. """
+        endpoints = list(endpoints or API_MAP)
+        snapshot = cls(manager_url=client.url)
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            futures = {
+                endpoint: executor.submit(lambda e: list(client._iter_config(e)), endpoint)
+                for endpoint in endpoints
+            }
+        for endpoint, future in futures.items():
+            try:
+                snapshot.objects[endpoint] = future.result()
+            except Exception as e:
+                # One endpoint failing to list (e.g. on an older Manager) spoils no others.
+                snapshot.errors[endpoint] = str(e)
+        return snapshot
+
+    @classmethod
+    def read(cls, path):
+        """ Load a snapshot written by 'write'. """
+        with gzip.open(path, "rt") as f:
+            data = json.load(f)
+        return cls(
+            manager_url=data.get("manager_url"),
+            taken_at=data.get("taken_at"),
+            objects=data.get("objects"),
+            errors=data.get("errors"),
+        )
+
+    def write(self, path):
+        """ Write the snapshot to 'path' as compact, gzip compressed JSON. """
+        data = {
+            "manager_url": self.manager_url,
+            "taken_at": self.taken_at,
+            "objects": self.objects,
+            "errors": self.errors,
+        }
+        with gzip.open(path, "wt") as f:
+            json.dump(data, f, separators=(",", ":"))
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+
+from pathlib import Path
+
+from .config import get_default_data_dir
+from .payload import BootstrapPayload
+
+
+def get_default_spool_dir() -> Path:
+    """ Spool bootstrap payloads next to the Pexip config, falling back to the users home. """
+    return get_default_data_dir() / "spool"
+
+
+class SpoolEntry:
+    """ A pending bootstrap: the node's hostname, the address to POST to, and its XML. """
+
+    def __init__(self, spool, hostname, address, enqueued_at=None, attempts=0):
+        self.spool = spool
+        self.hostname = hostname
+        self.address = address
+        self.enqueued_at = enqueued_at or time.time()
+        self.attempts = attempts
+
+    @property
+    def xml_path(self) -> Path:
+        return self.spool.directory / f"{self.hostname}.xml"
+
+    @property
+    def meta_path(self) -> Path:
+        return self.spool.directory / f"{self.hostname}.json"
+
+    def payload(self) -> BootstrapPayload:
+        return BootstrapPayload(self.xml_path)
+
+
+class Spool:
+    """A directory of bootstrap payloads waiting to be (re)sent to their nodes.
+
+    Each entry is a '<hostname>.xml' payload and a '<hostname>.json' record of the address to
+    bootstrap and the attempts made so far. The record is written last, and atomically, so
+    a partially written entry is never drained.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else get_default_spool_dir()
+
+    def enqueue(self, hostname, address, content) -> SpoolEntry:
+        """Add (or replace) the pending bootstrap of a node. 'content' is the XML document,
+        or the BootstrapPayload holding it."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = SpoolEntry(self, hostname, address)
+        if isinstance(content, BootstrapPayload):
+            content.save(entry.xml_path)
+        else:
+            entry.xml_path.write_bytes(content)
+        self.update(entry)
+        return entry
+
+    def update(self, entry):
+        """ Persist an entry's record, e.g. after another failed attempt. """
+        record = {
+            "hostname": entry.hostname,
+            "address": entry.address,
+            "enqueued_at": entry.enqueued_at,
+            "attempts": entry.attempts,
+        }
+        partial = entry.meta_path.with_suffix(".json.tmp")
+        with partial.open("wt") as f:
+            json.dump(record, f)
+        os.replace(partial, entry.meta_path)
+
+    def remove(self, entry):
+        """ Drop an entry once its node has been bootstrapped. """
+        for path in (entry.meta_path, entry.xml_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def entries(self):
+        """ Iterate over every pending entry, oldest first. """
+        if not self.directory.is_dir():
+            return
+        records = []
+        for path in self.directory.glob("*.json"):
+            try:
+                with path.open("rt") as f:
+                    records.append(json.load(f))
+            except (IOError, ValueError) as e:
+                print(f"Warning: Skipping unreadable spool entry {path}. Error: {e}")
+        for record in sorted(records, key=lambda r: r.get("enqueued_at", 0)):
+            yield SpoolEntry(self, **record)
+
+    def __len__(self):
+        return sum(1 for _ in self.directory.glob("*.json")) if self.directory.is_dir() else 0
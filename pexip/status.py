@@ -0,0 +1,183 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .definitions import BOOTSTRAP_PORT, DEFAULT_BOOTSTRAP_PARALLEL
+from .exceptions import ManagerRequestError
+from .provision import is_reachable
+
+# Status fields shown for, and compared between refreshes of, every node.
+STATUS_FIELDS = ["sync_status", "version", "maintenance_mode", "media_load"]
+
+# Refreshes a node must go unchanged for, reachable and synced, before it is settled.
+SETTLED_REFRESHES = 2
+
+# The 'sync_status' of a node which has taken on its configuration.
+SYNCED_STATUSES = ["SYNCED"]
+
+# Seconds to wait for a node's bootstrap port to accept a connection.
+PROBE_TIMEOUT = 1
+
+# Objects per listing page, so a whole fleet is usually a single request.
+PAGE_SIZE = 1000
+
+# The status field holding when a node last reported, used to list only updated nodes.
+UPDATED_FIELD = "last_updated"
+
+# Incremental refreshes between full ones, which also notice nodes that were deleted.
+FULL_REFRESH_EVERY = 10
+
+
+class NodeState:
+    """ The last known state of a single node. """
+
+    def __init__(self, name, address):
+        self.name = name
+        self.address = address
+        self.status = {}
+        self.reachable = None
+        self.unchanged = 0
+
+    @property
+    def settled(self) -> bool:
+        """ Whether the node is up and synced, and has stayed that way for a while. """
+        return (
+            self.reachable is True
+            and self.status.get("sync_status") in SYNCED_STATUSES
+            and self.unchanged >= SETTLED_REFRESHES
+        )
+
+    def update(self, status, reachable) -> bool:
+        """ Apply a refresh, returning whether anything changed. """
+        status = {field: status.get(field) for field in STATUS_FIELDS}
+        changed = status != self.status or reachable != self.reachable
+        self.status, self.reachable = status, reachable
+        self.unchanged = 0 if changed else self.unchanged + 1
+        return changed
+
+    def row(self) -> str:
+        reachable = {True: "yes", False: "no", None: "-"}[self.reachable]
+        values = " ".join(f"{str(self.status.get(field)):<16}" for field in STATUS_FIELDS)
+        return f"{self.name:<24} {str(self.address):<16} {reachable:<9} {values}"
+
+
+class FleetStatus:
+    """The state of every node in the Manager, refreshed in a couple of concurrent sweeps.
+
+    A full refresh lists the 'worker_vm' configuration (for node addresses) and status APIs
+    at the same time, a single request per page however many nodes there are, then probes
+    the bootstrap port of every node concurrently, 'parallel' at a time. An 'incremental'
+    refresh only lists the status of nodes updated since the last refresh (by their
+    'last_updated' time), lists the configuration again only when a new node shows up, and
+    no longer probes settled nodes (reachable and synced for a few refreshes). Every
+    FULL_REFRESH_EVERY incremental refreshes, or when the Manager cannot filter by update
+    time, a full refresh is made instead, which also drops deleted nodes.
+    """
+
+    def __init__(self, client, parallel=DEFAULT_BOOTSTRAP_PARALLEL, port=BOOTSTRAP_PORT):
+        self.client = client
+        self.port = port
+        self.nodes = {}
+        self._since = None
+        self._filterable = True
+        self._incremental = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, parallel))
+
+    def close(self):
+        self._executor.shutdown()
+
+    def _list(self, endpoint, **filters) -> list:
+        return list(self.client._iter_config(endpoint, page_size=PAGE_SIZE, filters=filters))
+
+    def _probe(self, node):
+        if not node.address:
+            return None
+        return is_reachable(node.address, self.port, timeout=PROBE_TIMEOUT)
+
+    def _configure(self, configs, full):
+        """ Add (and on a full refresh, drop) nodes, and update their addresses. """
+        configs = {config.get("name"): config for config in configs}
+        if full:
+            for name in set(self.nodes) - set(configs):
+                del self.nodes[name]
+        for name, config in configs.items():
+            if name is None:
+                continue
+            if name not in self.nodes:
+                self.nodes[name] = NodeState(name, config.get("address"))
+            self.nodes[name].address = config.get("address")
+
+    def _updated(self):
+        """ Status rows updated since the last refresh, or None if they cannot be filtered. """
+        try:
+            return self._list("node_status", **{f"{UPDATED_FIELD}__gte": self._since})
+        except ManagerRequestError:
+            # Tastypie refuses filters on fields that don't allow them.
+            self._filterable = False
+            return None
+
+    def refresh(self, incremental=False) -> list:
+        """ Refresh every node (only changing ones if 'incremental'), returning those changed. """
+        rows = None
+        if (
+            incremental
+            and self._since
+            and self._filterable
+            and self._incremental < FULL_REFRESH_EVERY
+        ):
+            rows = self._updated()
+        full = rows is None
+        if full:
+            listing = self._executor.submit(self._list, "node")
+            rows = self._list("node_status")
+            self._configure(listing.result(), full=True)
+            self._incremental = 0
+        else:
+            self._incremental += 1
+            if any(row.get("name") not in self.nodes for row in rows):
+                self._configure(self._list("node"), full=False)
+        updated = [row[UPDATED_FIELD] for row in rows if row.get(UPDATED_FIELD)]
+        self._since = max([*updated, self._since or ""]) or None
+
+        targets = [
+            node for node in self.nodes.values() if not (incremental and node.settled)
+        ]
+        probes = {node.name: self._executor.submit(self._probe, node) for node in targets}
+        statuses = {row.get("name"): row for row in rows}
+
+        changed = []
+        for node in targets:
+            if full:
+                status = statuses.get(node.name, {})
+            else:
+                status = statuses.get(node.name, node.status)
+            if node.update(status, probes[node.name].result()):
+                changed.append(node)
+        return changed
+
+    @property
+    def settled(self) -> bool:
+        return all(node.settled for node in self.nodes.values())
+
+    def print(self, nodes=None):
+        nodes = self.nodes.values() if nodes is None else nodes
+        fields = " ".join(f"{field:<16}" for field in STATUS_FIELDS)
+        print(f"{'NAME':<24} {'ADDRESS':<16} {'REACHABLE':<9} {fields.upper()}")
+        for node in sorted(nodes, key=lambda node: node.name):
+            print(node.row())
+        reachable = sum(1 for node in self.nodes.values() if node.reachable)
+        settled = sum(1 for node in self.nodes.values() if node.settled)
+        print(f"{len(self.nodes)} nodes: {reachable} reachable, {settled} settled.")
+
+
+def watch(fleet, interval):
+    """Refresh 'fleet' every 'interval' seconds, printing only the nodes that changed, until
+    every node has settled."""
+    fleet.refresh()
+    fleet.print()
+    while not fleet.settled:
+        time.sleep(interval)
+        changed = fleet.refresh(incremental=True)
+        if changed:
+            print(time.strftime("%H:%M:%S"))
+            fleet.print(changed)
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import threading
+
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+TRACE_JSON = "json"
+TRACE_CHROME = "chrome"
+TRACE_FORMATS = [TRACE_JSON, TRACE_CHROME]
+
+# The Tracer spans are recorded into, or None while tracing is disabled.
+tracer = None
+
+
+class Tracer:
+    """Records timing spans per node and per phase, from any thread.
+
+    Each span is a dictionary of its name, the node it belongs to (if any), start time and
+    duration in seconds relative to the creation of the Tracer, the thread that recorded it,
+    and any extra attributes.
+    """
+
+    def __init__(self):
+        self.epoch = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, name, start, end, node=None, **attrs):
+        """ Record a span measured elsewhere, 'start' and 'end' are time.perf_counter() values. """
+        span = {
+            "name": name,
+            "node": node,
+            "start": start - self.epoch,
+            "duration": end - start,
+            "thread": threading.get_ident(),
+            **attrs,
+        }
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name, node=None, **attrs):
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.record(name, start, time.perf_counter(), node=node, **attrs)
+
+    def _chrome_events(self):
+        """ Spans as Chrome trace events, with one row per node (or thread, without a node). """
+        rows = {}
+        events = []
+        for span in self.spans:
+            row = span["node"] or f"thread-{span['thread']}"
+            if row not in rows:
+                rows[row] = len(rows) + 1
+                events.append(
+                    {
+                        "ph": "M",
+                        "name": "thread_name",
+                        "pid": 1,
+                        "tid": rows[row],
+                        "args": {"name": row},
+                    }
+                )
+            args = {k: v for k, v in span.items() if k not in ("name", "start", "duration")}
+            events.append(
+                {
+                    "ph": "X",
+                    "name": span["name"],
+                    "pid": 1,
+                    "tid": rows[row],
+                    "ts": span["start"] * 1e6,
+                    "dur": span["duration"] * 1e6,
+                    "args": args,
+                }
+            )
+        return events
+
+    def export(self, path, fmt=TRACE_JSON):
+        """ Write every recorded span to 'path' as JSON, or in Chrome's trace event format. """
+        with self._lock:
+            data = {"traceEvents": self._chrome_events()} if fmt == TRACE_CHROME else self.spans
+        with open(path, "wt") as f:
+            json.dump(data, f, default=str)
+        print(f"Wrote {len(self.spans)} trace spans to {path}")
+
+
+def enable() -> Tracer:
+    """ Start recording spans for the rest of the run. """
+    global tracer
+    tracer = Tracer()
+    return tracer
+
+
+def span(name, node=None, **attrs):
+    """ Time the enclosed block as a span, if tracing is enabled. """
+    if tracer is None:
+        return nullcontext(attrs)
+    return tracer.span(name, node=node, **attrs)
+
+
+def record(name, start, end, node=None, **attrs):
+    """ Record a span measured elsewhere, if tracing is enabled. """
+    if tracer is not None:
+        tracer.record(name, start, end, node=node, **attrs)
+
+
+@contextmanager
+def profile(directory):
+    """Capture cProfile statistics and tracemalloc allocations for the enclosed block, and
+    write them to 'directory' as 'pexip.prof' and 'tracemalloc.txt'. A no-op without one.
+    Threads started within the block (batch and bootstrap workers) are profiled too, and
+    their statistics merged with those of the main thread."""
+    if not directory:
+        yield
+        return
+
+    import sys
+    import pstats
+    import cProfile
+    import tracemalloc
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile()
+    workers = []
+
+    def _profile_thread(frame, event, arg):
+        # Runs once within each new thread, replacing itself with that thread's profiler.
+        worker = cProfile.Profile()
+        workers.append(worker)
+        worker.enable()
+
+    # From Python 3.12 cProfile uses sys.monitoring, which already sees every thread.
+    per_thread = sys.version_info < (3, 12)
+    tracemalloc.start()
+    if per_thread:
+        threading.setprofile(_profile_thread)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if per_thread:
+            threading.setprofile(None)
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats = pstats.Stats(profiler)
+        for worker in list(workers):
+            worker.create_stats()
+            if worker.stats:
+                stats.add(worker)
+        stats.dump_stats(directory / "pexip.prof")
+        with (directory / "tracemalloc.txt").open("wt") as f:
+            f.write(f"Current: {current} bytes{os.linesep}Peak: {peak} bytes{os.linesep}")
+            for stat in snapshot.statistics("lineno")[:50]:
+                f.write(f"{stat}{os.linesep}")
+        print(f"Wrote profile to {directory}")
@@ -1,12 +1,18 @@
+from concurrent.futures import FIRST_COMPLETED, as_completed, wait
+
 import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
+from . import metrics
+from .definitions import DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE
+
 # These globals are for 'requests_retry_session' in conjunction with sending requests to a
 # freshly provisioning EC2 AMI (the conference node)
 PROVISION_RETRIES = 10        # Make a total of int() requests.
 PROVISION_BACKOFF_FACTOR = 1  # A backoff factor of 1 will look like 1, 2, 4, 8, 16 for 5 requests.
 
+
 def requests_retry_session(
     retries=PROVISION_RETRIES,
     backoff_factor=PROVISION_BACKOFF_FACTOR,
@@ -26,3 +32,31 @@ def requests_retry_session(
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
+
+
+def pooled_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """Create a requests 'session' object backed by a keep-alive connection pool.
+    The pool blocks rather than opening extra connections, so a session may be shared
+    by many worker threads without exceeding 'pool_maxsize' connections per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return metrics.instrument(session)
+
+
+def bounded_submit(executor, fn, items, limit, *args):
+    """Submit 'fn(item, *args)' to 'executor' for every item, keeping at most 'limit' in
+    flight. Items are consumed lazily, so a streamed input is never read far ahead of the
+    workers. Yields (item, future) pairs as each future completes."""
+    pending = {}
+    for item in items:
+        if len(pending) >= limit:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+        pending[executor.submit(fn, item, *args)] = item
+    for future in as_completed(pending):
+        yield pending[future], future
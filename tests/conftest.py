@@ -0,0 +1,35 @@
+import pytest
+
+from pexip.data import NodeSpec
+
+
+def listing(*objects):
+    """ A single page Tastypie listing of 'objects'. """
+    return {"meta": {"next": None, "total_count": len(objects)}, "objects": list(objects)}
+
+
+@pytest.fixture
+def make_transcoder(httpserver):
+    """ Build the CLI data for a node, pointed at the test Manager. """
+
+    def _transcoder(hostname, **kwargs):
+        return NodeSpec(
+            **{
+                "hostname": hostname,
+                "manager_url": httpserver.url_for("").rstrip("/"),
+                "auth_user": "admin",
+                "auth_pass": "admin",
+                "insecure": False,
+                "domain": "company.com",
+                "private_ip": "127.0.0.1",
+                "public_ip": "52.41.93.113",
+                "netmask": "255.255.255.0",
+                "gateway": "127.0.0.254",
+                "node_password": "secret",
+                "tls_certificate_subject_name": "*.company.com",
+                "system_location_name": "production",
+                **kwargs,
+            }
+        )
+
+    return _transcoder
@@ -0,0 +1,201 @@
+"""
+A simulated Pexip Manager and fake Conferencing Node bootstrap endpoints, for benchmarks.
+"""
+import re
+import json
+import time
+import random
+import threading
+
+from collections import Counter
+from urllib.parse import urlencode
+
+from pytest_httpserver import HTTPServer
+from werkzeug.wrappers import Response
+
+from pexip.definitions import API_MAP, STATUS_MAP
+
+ROUTES = {route: endpoint for endpoint, route in {**API_MAP, **STATUS_MAP}.items()}
+
+TLS_CERTIFICATE = "*.company.com"
+SYSTEM_LOCATION = "production"
+
+
+def _matches(obj, key, val):
+    field, _, lookup = key.partition("__")
+    if lookup == "gte":
+        return obj.get(field) is not None and str(obj.get(field)) >= val
+    return str(obj.get(key)) == val
+
+
+class FakeManager:
+    """A Pexip Manager serving every API_MAP endpoint as a Tastypie listing.
+
+    'nodes' existing worker_vm objects are generated up front. Listings honour limit/offset
+    and filters on any field (exact, or '<field>__gte'), worker_vm objects can be created
+    (returning a bootstrap XML document) and deleted, and every request is counted by (method, endpoint).
+    'latency' seconds are added to every response.
+    """
+
+    def __init__(self, nodes=0, latency=0.0):
+        self.latency = latency
+        self.requests = Counter()
+        self.objects = {endpoint: [] for endpoint in ROUTES.values()}
+        self.objects["tls_cert"].append({"id": 1, "subject_name": TLS_CERTIFICATE})
+        self.objects["system_location"].append({"id": 1, "name": SYSTEM_LOCATION})
+        for i in range(nodes):
+            self.objects["node"].append(
+                {
+                    "id": i + 1,
+                    "name": f"existing{i:05}",
+                    "address": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+                    "system_location": f"{API_MAP['system_location']}1/",
+                }
+            )
+        self._next_id = nodes + 1
+        self._lock = threading.Lock()
+        self.server = HTTPServer(host="127.0.0.1", threaded=True)
+        self.server.expect_request(re.compile(".*")).respond_with_handler(self.handler)
+
+    def __enter__(self):
+        self.server.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.clear()
+        if self.server.is_running():
+            self.server.stop()
+
+    @property
+    def url(self):
+        return self.server.url_for("").rstrip("/")
+
+    @property
+    def total_requests(self):
+        return sum(self.requests.values())
+
+    def _route(self, path):
+        """ Split a request path into its endpoint and object ID, if any. """
+        path = "/" + path.lstrip("/")
+        for route, endpoint in ROUTES.items():
+            if path.startswith(route):
+                object_id = path[len(route) :].strip("/")
+                return endpoint, int(object_id) if object_id else None
+        return None, None
+
+    def handler(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        endpoint, object_id = self._route(request.path)
+        with self._lock:
+            self.requests[(request.method, endpoint)] += 1
+        if endpoint is None:
+            return Response("Not Found", status=404)
+        if request.method == "GET":
+            return self._list(request, endpoint)
+        if request.method == "POST" and endpoint == "node":
+            return self._create(request)
+        if request.method == "DELETE" and object_id:
+            return self._delete(endpoint, object_id)
+        return Response("Method Not Allowed", status=405)
+
+    def _list(self, request, endpoint):
+        limit = int(request.args.get("limit", 20))
+        offset = int(request.args.get("offset", 0))
+        filters = {k: v for k, v in request.args.items() if k not in ("limit", "offset")}
+        with self._lock:
+            objects = [
+                obj
+                for obj in self.objects[endpoint]
+                if all(_matches(obj, k, v) for k, v in filters.items())
+            ]
+        route = API_MAP.get(endpoint) or STATUS_MAP[endpoint]
+        next_offset = offset + limit
+        next_page = None
+        if next_offset < len(objects):
+            query = urlencode({**filters, "limit": limit, "offset": next_offset})
+            next_page = f"{route}?{query}"
+        body = {
+            "meta": {
+                "limit": limit,
+                "offset": offset,
+                "next": next_page,
+                "total_count": len(objects),
+            },
+            "objects": objects[offset:next_offset],
+        }
+        return Response(json.dumps(body), content_type="application/json")
+
+    def _create(self, request):
+        data = json.loads(request.get_data())
+        with self._lock:
+            if any(obj["name"] == data["name"] for obj in self.objects["node"]):
+                return Response("Already exists", status=400)
+            node_id = self._next_id
+            self.objects["node"].append({**data, "id": node_id})
+            self._next_id += 1
+        xml = (
+            '<?xml version="1.0"?><configuration>'
+            f"<hostname>{data['hostname']}</hostname><address>{data['address']}</address>"
+            f"{'<padding/>' * 256}</configuration>"
+        )
+        location = f"{API_MAP['node']}{node_id}/"
+        return Response(xml, status=201, content_type="text/xml", headers={"Location": location})
+
+    def _delete(self, endpoint, object_id):
+        with self._lock:
+            objects = self.objects[endpoint]
+            self.objects[endpoint] = [obj for obj in objects if obj["id"] != object_id]
+            found = len(objects) != len(self.objects[endpoint])
+        return Response(status=204 if found else 404)
+
+
+class FakeBootstrap:
+    """Fake Conferencing Node bootstrap endpoints, all served from one local port.
+
+    Every POST takes 'latency' seconds and fails with a retryable 503 with probability
+    'failure_rate', as a node which hasn't finished booting would.
+    """
+
+    route = "/configuration/bootstrap"
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.bootstrapped = set()
+        self._lock = threading.Lock()
+        self.server = HTTPServer(host="127.0.0.1", threaded=True)
+        self.server.expect_request(self.route, method="POST").respond_with_handler(self.handler)
+
+    def __enter__(self):
+        self.server.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.clear()
+        if self.server.is_running():
+            self.server.stop()
+
+    @property
+    def url(self):
+        """ A BootstrapPipeline 'url' template pointing at this server over plain HTTP. """
+        return "http://{address}:{port}" + self.route
+
+    @property
+    def port(self):
+        return self.server.port
+
+    def handler(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            failed = self.random.random() < self.failure_rate
+        if failed:
+            return Response("Node is still starting", status=503)
+        body = request.get_data(as_text=True)
+        with self._lock:
+            self.bootstrapped.add(body[body.find("<hostname>") + 10 : body.find("</hostname>")])
+        return Response("OK")
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from pexip.aio import AsyncPexipClient
+from pexip.exceptions import ConfigurationNotFound, TranscoderAlreadyExists, TranscoderNotFound
+
+from simulator import FakeBootstrap, FakeManager, SYSTEM_LOCATION, TLS_CERTIFICATE
+
+
+def _node(i, **kwargs):
+    return {
+        "hostname": f"transcoder{i:04}",
+        "private_ip": "127.0.0.1",
+        "public_ip": "52.41.93.113",
+        "netmask": "255.255.255.0",
+        "gateway": "127.0.0.254",
+        "domain": "company.com",
+        "node_password": "secret",
+        "system_location_name": SYSTEM_LOCATION,
+        "tls_certificate_subject_name": TLS_CERTIFICATE,
+        **kwargs,
+    }
+
+
+def _client(manager, bootstrap=None, **kwargs):
+    if bootstrap:
+        kwargs.update(bootstrap_url=bootstrap.url, bootstrap_port=bootstrap.port)
+    return AsyncPexipClient(
+        manager.url, "admin", "admin", bootstrap_poll_interval=0.01, **kwargs
+    )
+
+
+def test_provision_many_nodes_from_one_loop():
+    """ Test hundreds of nodes are created and bootstrapped with a handful of threads """
+
+    async def _provision(client):
+        async with client:
+            return await asyncio.gather(*(client.provision_node(**_node(i)) for i in range(300)))
+
+    with FakeManager(nodes=50) as manager, FakeBootstrap(failure_rate=0.3) as bootstrap:
+        client = _client(manager, bootstrap, concurrency=4, bootstrap_concurrency=8)
+        documents = asyncio.run(_provision(client))
+
+    assert len(documents) == len(bootstrap.bootstrapped) == 300
+    # Every lookup was answered from a single listing of each endpoint.
+    assert manager.requests[("GET", "tls_cert")] == 1
+    assert manager.requests[("GET", "system_location")] == 1
+    assert manager.requests[("POST", "node")] == 300
+
+
+def test_typed_errors():
+    """ Test failures are raised as exceptions, rather than printed """
+
+    async def _run(client):
+        async with client:
+            with pytest.raises(TranscoderAlreadyExists):
+                await client.create_node(**_node(0, hostname="existing00000"))
+            with pytest.raises(ConfigurationNotFound):
+                await client.create_node(**_node(1, system_location_name="staging"))
+            await client.delete_node("existing00001")
+            with pytest.raises(TranscoderNotFound):
+                await client.delete_node("existing00001")
+
+    with FakeManager(nodes=2) as manager:
+        asyncio.run(_run(_client(manager)))
+
+    assert manager.requests[("DELETE", "node")] == 1
@@ -0,0 +1,91 @@
+"""
+Benchmarks of node creation against a simulated Manager and fake bootstrap endpoints.
+
+Run them alone with 'pytest -m benchmark -s'. Sizes can be raised with the environment
+variables below, and a JSON report of every run is appended to $PEXIP_BENCHMARK_REPORT.
+"""
+import os
+import json
+import time
+import tracemalloc
+
+import pytest
+
+from pexip.context import RunContext
+from pexip.core import CREATED, create_batch
+from pexip.definitions import DEFAULT_PAGE_SIZE, LOOKUP_FILTER, LOOKUP_LISTING
+from pexip.provision import BootstrapPipeline
+
+from simulator import FakeBootstrap, FakeManager
+
+EXISTING_NODES = int(os.environ.get("PEXIP_BENCHMARK_EXISTING_NODES", 2000))
+BATCH_NODES = int(os.environ.get("PEXIP_BENCHMARK_BATCH_NODES", 50))
+MANAGER_LATENCY = float(os.environ.get("PEXIP_BENCHMARK_MANAGER_LATENCY", 0.005))
+BOOTSTRAP_LATENCY = float(os.environ.get("PEXIP_BENCHMARK_BOOTSTRAP_LATENCY", 0.01))
+BOOTSTRAP_FAILURE_RATE = float(os.environ.get("PEXIP_BENCHMARK_BOOTSTRAP_FAILURE_RATE", 0.2))
+
+pytestmark = pytest.mark.benchmark
+
+
+def _run(name, make_transcoder, manager, bootstrap, count, parallel, lookup):
+    """ Create 'count' nodes, reporting wall-clock time, requests per node and peak memory. """
+    transcoders = [
+        make_transcoder(f"transcoder{i:05}", manager_url=manager.url) for i in range(count)
+    ]
+    context = RunContext(lookup=lookup, pool_size=max(parallel, 10))
+    pipeline = BootstrapPipeline(
+        parallel=parallel, url=bootstrap.url, port=bootstrap.port, poll_interval=0.05, deadline=30
+    )
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = create_batch(transcoders, parallel=parallel, context=context, pipeline=pipeline)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    context.close()
+
+    report = {
+        "benchmark": name,
+        "nodes": count,
+        "existing_nodes": EXISTING_NODES,
+        "parallel": parallel,
+        "lookup": lookup,
+        "seconds": round(elapsed, 4),
+        "nodes_per_second": round(count / elapsed, 2),
+        "manager_requests": manager.total_requests,
+        "manager_requests_per_node": round(manager.total_requests / count, 2),
+        "bootstrap_requests": bootstrap.requests,
+        "peak_memory_bytes": peak,
+    }
+    print(json.dumps(report))
+    if os.environ.get("PEXIP_BENCHMARK_REPORT"):
+        with open(os.environ["PEXIP_BENCHMARK_REPORT"], "at") as f:
+            f.write(json.dumps(report) + "\n")
+
+    assert all(outcome == CREATED for outcome, _ in results.values())
+    assert len(bootstrap.bootstrapped) == count
+    return report
+
+
+def test_benchmark_single_create(make_transcoder):
+    """ A single node uses filtered lookups: three queries and one POST to the Manager """
+    with FakeManager(nodes=EXISTING_NODES, latency=MANAGER_LATENCY) as manager:
+        with FakeBootstrap(latency=BOOTSTRAP_LATENCY) as bootstrap:
+            report = _run("single_create", make_transcoder, manager, bootstrap, 1, 1, LOOKUP_FILTER)
+
+    assert report["manager_requests"] == 4
+
+
+def test_benchmark_batch_create(make_transcoder):
+    """ A batch lists each endpoint once, then sends one POST per node to the Manager """
+    with FakeManager(nodes=EXISTING_NODES, latency=MANAGER_LATENCY) as manager:
+        with FakeBootstrap(
+            latency=BOOTSTRAP_LATENCY, failure_rate=BOOTSTRAP_FAILURE_RATE
+        ) as bootstrap:
+            report = _run(
+                "batch_create", make_transcoder, manager, bootstrap, BATCH_NODES, 16, LOOKUP_LISTING
+            )
+
+    node_pages = -(-EXISTING_NODES // DEFAULT_PAGE_SIZE) or 1
+    assert report["manager_requests"] == BATCH_NODES + node_pages + 2
@@ -1 +1,122 @@
-TODO
+import json
+
+import pytest
+
+from pexip.cli.args import parser
+from pexip.inventory import read_inventory
+
+
+def test_create_batch_parallel():
+    """ Test a JSON list of hostnames is split into one record per node """
+    hostnames = json.dumps([{"hostname": "node01"}, {"hostname": "node02"}])
+    data, action = parser.parse_args(["create", hostnames, "--parallel", "4"])
+
+    assert action == "create"
+    assert [d.hostname for d in data] == ["node01", "node02"]
+    assert all(d.parallel == 4 for d in data)
+
+
+def test_create_inventory_ndjson(tmp_path):
+    """ Test nodes are streamed from an NDJSON inventory and merged with global options """
+    inventory = tmp_path / "inventory.ndjson"
+    inventory.write_text('{"hostname": "node01"}\n{"hostname": "node02", "domain": "b.com"}\n')
+    data, action = parser.parse_args(
+        ["create", "--inventory", str(inventory), "--domain", "a.com"]
+    )
+
+    assert [(d.hostname, d.domain) for d in data] == [("node01", "a.com"), ("node02", "b.com")]
+
+
+def test_create_inventory_terraform(tmp_path):
+    """ Test nodes are read from the output of 'terraform output -json' """
+    inventory = tmp_path / "outputs.json"
+    inventory.write_text(
+        json.dumps(
+            {
+                "transcoders": {
+                    "sensitive": False,
+                    "type": ["list", ["object", {"hostname": "string"}]],
+                    "value": [{"hostname": "node01"}, {"hostname": "node02"}],
+                }
+            }
+        )
+    )
+    data, action = parser.parse_args(["create", "--inventory", str(inventory)])
+
+    assert [d.hostname for d in data] == ["node01", "node02"]
+
+
+def test_batch_records_share_global_options():
+    """ Test every node record reads the global options from one shared layer """
+    hostnames = json.dumps(["node01", {"hostname": "node02", "domain": "b.com"}])
+    data, action = parser.parse_args(["create", hostnames, "--domain", "a.com"])
+
+    assert data[0].defaults is data[1].defaults
+    assert [d.domain for d in data] == ["a.com", "b.com"]
+    assert not hasattr(data[0], "__dict__")
+
+
+def test_nodes_split_between_managers(tmp_path, monkeypatch):
+    """ Test each node is handed to the Manager its inventory key or manager_url names """
+    from pexip.config import get_default_config_dir
+
+    for name in ("eu", "us"):
+        config = {"MANAGER_URL": f"https://{name}.company.com", "DOMAIN": f"{name}.com"}
+        (tmp_path / f"{name}.config.json").write_text(json.dumps(config))
+    inventory = tmp_path / "inventory.json"
+    inventory.write_text(
+        json.dumps(
+            {
+                "eu": ["node01", {"hostname": "node02"}],
+                "us.config.json": [{"hostname": "node03"}],
+            }
+        )
+    )
+    monkeypatch.setenv("PEXIP_CONFIG_DIR", str(tmp_path))
+    get_default_config_dir.cache_clear()
+    try:
+        data, action = parser.parse_args(
+            [
+                "--config-file",
+                "eu.config.json",
+                "--config-file",
+                "us.config.json",
+                "create",
+                "--inventory",
+                str(inventory),
+            ]
+        )
+    finally:
+        get_default_config_dir.cache_clear()
+
+    assert {name: [(d.hostname, d.domain) for d in nodes] for name, nodes in data.items()} == {
+        "eu": [("node01", "eu.com"), ("node02", "eu.com")],
+        "us": [("node03", "us.com")],
+    }
+    assert data["us"][0].manager_url == "https://us.company.com"
+
+
+def test_truncated_inventory_is_reported(tmp_path, capsys):
+    """ Test a malformed inventory is reported as an error, rather than a traceback """
+    from pexip.core import main
+
+    inventory = tmp_path / "inventory.json"
+    inventory.write_text('[{"hostname": "node01"}, {"hostname": ')
+    with pytest.raises(SystemExit) as exit:
+        main(["pexip", "create", "--inventory", str(inventory)])
+
+    assert exit.value.code == 1
+    assert capsys.readouterr().out.startswith("Error: Invalid JSON within the inventory")
+
+
+def test_ndjson_records_of_lists_are_nodes(tmp_path):
+    """ Test NDJSON node records whose fields are all lists aren't read as a Manager map """
+    inventory = tmp_path / "inventory.ndjson"
+    inventory.write_text('{"hostname": ["node01"]}\n{"hostname": ["node02"]}\n')
+    single = tmp_path / "single.ndjson"
+    single.write_text('{"tags": ["a", "b"]}\n')
+
+    with inventory.open() as fp:
+        assert list(read_inventory(fp)) == [{"hostname": ["node01"]}, {"hostname": ["node02"]}]
+    with single.open() as fp:
+        assert list(read_inventory(fp)) == [{"tags": ["a", "b"]}]
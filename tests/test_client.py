@@ -0,0 +1,100 @@
+import json
+
+import pytest
+from werkzeug.wrappers import Response
+
+from pexip.data import NodeSpec
+from pexip.models import PexipClient
+
+NODE_ROUTE = "/api/admin/configuration/v1/worker_vm/"
+
+
+@pytest.fixture(autouse=True)
+def reset_unfilterable():
+    PexipClient._unfilterable.clear()
+
+
+def _client(httpserver, **kwargs):
+    return PexipClient(
+        NodeSpec(
+            manager_url=httpserver.url_for("").rstrip("/"),
+            auth_user="admin",
+            auth_pass="admin",
+            insecure=False,
+            **kwargs,
+        )
+    )
+
+
+def _paged_listing(objects, filterable=None):
+    """ Serve 'objects' as a Tastypie listing, honouring limit/offset and 'name' filters. """
+
+    def handler(request):
+        if "name" in request.args:
+            if not filterable:
+                return Response("The 'name' field does not allow filtering.", status=400)
+            objects_ = [o for o in objects if o["name"] == request.args["name"]]
+            body = {"meta": {"next": None}, "objects": objects_}
+            return Response(json.dumps(body), content_type="application/json")
+        limit = int(request.args.get("limit", 20))
+        offset = int(request.args.get("offset", 0))
+        next_offset = offset + limit
+        next_page = (
+            f"{NODE_ROUTE}?limit={limit}&offset={next_offset}"
+            if next_offset < len(objects)
+            else None
+        )
+        body = {
+            "meta": {"limit": limit, "offset": offset, "next": next_page},
+            "objects": objects[offset:next_offset],
+        }
+        return Response(json.dumps(body), content_type="application/json")
+
+    return handler
+
+
+def test_iter_config_follows_next(httpserver):
+    """ Test every page of a listing is yielded """
+    nodes = [{"id": i, "name": f"node{i:03}"} for i in range(250)]
+    httpserver.expect_request(NODE_ROUTE).respond_with_handler(_paged_listing(nodes))
+
+    client = _client(httpserver, page_size=100)
+
+    assert list(client._iter_config("node")) == nodes
+    assert len(httpserver.log) == 3
+
+
+def test_lookup_stops_at_match(httpserver):
+    """ Test a lookup only requests pages until it finds a match """
+    nodes = [{"id": i, "name": f"node{i:03}"} for i in range(250)]
+    httpserver.expect_request(NODE_ROUTE).respond_with_handler(_paged_listing(nodes))
+
+    client = _client(httpserver, page_size=50)
+
+    assert client._filter_by(client._iter_config("node"), key="name", val="node120")
+    assert len(httpserver.log) == 3
+
+
+def test_query_filters_server_side(httpserver):
+    """ Test a lookup is answered with a single filtered request """
+    nodes = [{"id": i, "name": f"node{i:03}"} for i in range(250)]
+    httpserver.expect_request(NODE_ROUTE).respond_with_handler(_paged_listing(nodes, True))
+
+    client = _client(httpserver, page_size=50)
+
+    assert client._node_exists("node240")
+    assert not client._node_exists("node999")
+    assert len(httpserver.log) == 2
+
+
+def test_query_falls_back_to_listing(httpserver):
+    """ Test a lookup scans the listing when the Manager rejects the filter """
+    nodes = [{"id": i, "name": f"node{i:03}"} for i in range(250)]
+    httpserver.expect_request(NODE_ROUTE).respond_with_handler(_paged_listing(nodes))
+
+    client = _client(httpserver, page_size=100)
+
+    assert client._node_exists("node120")
+    assert len(httpserver.log) == 3
+    assert client._node_exists("node010")
+    assert len(httpserver.log) == 4
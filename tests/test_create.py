@@ -1,8 +1,120 @@
+import re
+import json
+
+import pytest
 import requests
 
+from pexip import journal, tracing
+from pexip.context import RunContext
+from pexip.core import COMPLETED, CREATED, EXISTS, FAILED, create_batch
+from pexip.models import PexipNode
+from pexip.provision import BootstrapPipeline
+
+from conftest import listing
+
 
 def test_hello(httpserver):
     """ Test Hello """
     httpserver.expect_request("/hello").respond_with_json({"hello": "world"})
 
     assert requests.get(httpserver.url_for("/hello")).json() == {"hello": "world"}
+
+
+@pytest.fixture
+def rejected_batch(httpserver, make_transcoder):
+    """ A batch of one existing and two new nodes, for a Manager which rejects new nodes. """
+    httpserver.expect_request(re.compile(".*/worker_vm/"), method="GET").respond_with_json(
+        listing({"id": 1, "name": "existing"})
+    )
+    httpserver.expect_request(re.compile(".*/tls_certificate/")).respond_with_json(
+        listing({"id": 1, "subject_name": "*.company.com"})
+    )
+    httpserver.expect_request(re.compile(".*/system_location/")).respond_with_json(
+        listing({"id": 2, "name": "production"})
+    )
+    httpserver.expect_request(re.compile(".*/worker_vm/"), method="POST").respond_with_data(
+        "Bad Request", status=400
+    )
+    return [make_transcoder(h) for h in ("existing", "rejected01", "rejected02")]
+
+
+def test_create_batch_isolates_failures(rejected_batch):
+    """ Test one failing node does not abort the rest of the batch """
+    results = create_batch(rejected_batch, parallel=3)
+
+    assert results["existing"][0] == EXISTS
+    assert results["rejected01"][0] == FAILED
+    assert results["rejected02"][0] == FAILED
+    assert CREATED not in {outcome for outcome, _ in results.values()}
+
+
+def test_create_batch_shares_lookups(httpserver, rejected_batch):
+    """ Test each Manager listing is fetched once for a whole batch """
+    create_batch(rejected_batch, parallel=3)
+
+    gets = [req.path for req, _ in httpserver.log if req.method == "GET"]
+    assert sorted(gets) == sorted(
+        [
+            "/api/admin/configuration/v1/worker_vm/",
+            "/api/admin/configuration/v1/tls_certificate/",
+            "/api/admin/configuration/v1/system_location/",
+        ]
+    )
+
+
+def test_create_batch_reuses_connections(make_transcoder):
+    """ Test every node in a batch shares one keep-alive connection pool """
+    context = RunContext()
+    transcoders = [make_transcoder(f"node{i:02}") for i in range(5)]
+    sessions = {id(PexipNode(t, context=context).client) for t in transcoders}
+
+    assert len(sessions) == 1
+
+
+def test_create_batch_traced(rejected_batch, tmp_path, monkeypatch):
+    """ Test Manager calls are recorded as spans per node and exported for Chrome """
+    tracer = tracing.Tracer()
+    monkeypatch.setattr(tracing, "tracer", tracer)
+    create_batch(rejected_batch, parallel=3)
+
+    phases = {(span["node"], span["name"]) for span in tracer.spans}
+    assert ("rejected01", "node.configure") in phases
+    assert ("rejected01", "manager.post") in phases
+
+    tracer.export(tmp_path / "trace.json", tracing.TRACE_CHROME)
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert {event["ph"] for event in events} == {"M", "X"}
+
+
+def test_create_batch_resumes_from_journal(httpserver, make_transcoder, tmp_path):
+    """ Test a resumed run skips journaled work without calling the Manager """
+    httpserver.expect_request("/configuration/bootstrap", method="POST").respond_with_data("OK")
+    path = tmp_path / "run.journal"
+    previous = journal.Journal(path)
+    for phase in journal.PHASES:
+        previous.record("node01", phase, b"<xml>node01</xml>")
+    previous.record("node02", journal.VALIDATED)
+    previous.record("node02", journal.CREATED)
+    previous.record("node02", journal.XML_RECEIVED, b"<xml>node02</xml>")
+
+    context = RunContext(journal=journal.Journal(path, resume=True))
+    pipeline = BootstrapPipeline(
+        url="http://{address}:{port}/configuration/bootstrap", port=httpserver.port
+    )
+    transcoders = [make_transcoder("node01"), make_transcoder("node02")]
+    results = create_batch(transcoders, context=context, pipeline=pipeline)
+
+    assert results == {"node01": (COMPLETED, None), "node02": (CREATED, None)}
+    assert [req.get_data() for req, _ in httpserver.log] == [b"<xml>node02</xml>"]
+    assert journal.Journal(path, resume=True).last_phase("node02") == journal.BOOTSTRAPPED
+
+
+def test_create_batch_profiled(rejected_batch, tmp_path):
+    """ Test the profile of a batch includes the work done by its worker threads """
+    import pstats
+
+    with tracing.profile(tmp_path):
+        create_batch(rejected_batch, parallel=3)
+
+    functions = {name for _, _, name in pstats.Stats(str(tmp_path / "pexip.prof")).stats}
+    assert "create_node" in functions
@@ -0,0 +1,50 @@
+import gzip
+import json
+
+import pytest
+import requests
+from werkzeug.wrappers import Response
+
+from pexip import decode
+
+OBJECTS = [
+    {"id": i, "name": f"nöde{i:03}", "load": i / 4, "tags": [1, {"a": None}], "ok": i % 2 == 0}
+    for i in range(50)
+]
+
+
+@pytest.fixture(params=["ijson", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "ijson" and decode.ijson is None:
+        pytest.skip("ijson is not installed")
+    if request.param == "stdlib":
+        monkeypatch.setattr(decode, "ijson", None)
+    # Small chunks, so values and multi-byte characters are split across them.
+    monkeypatch.setattr(decode, "CHUNK_SIZE", 7)
+
+
+def test_iter_listing_streams_gzip(httpserver, backend):
+    """ Test every object and the meta fields are decoded from a gzip compressed listing """
+    body = {"objects": OBJECTS, "meta": {"next": "/next?offset=50", "total_count": 120}}
+
+    def handler(request):
+        assert "gzip" in request.headers["Accept-Encoding"]
+        compressed = gzip.compress(json.dumps(body, indent=1).encode())
+        return Response(compressed, headers={"Content-Encoding": "gzip"})
+
+    httpserver.expect_request("/listing").respond_with_handler(handler)
+
+    meta = {}
+    with requests.get(httpserver.url_for("/listing"), stream=True) as response:
+        assert list(decode.iter_listing(response, meta)) == OBJECTS
+    assert meta == {"next": "/next?offset=50", "total_count": 120}
+
+
+def test_iter_listing_empty(httpserver, backend):
+    """ Test an empty listing yields nothing """
+    httpserver.expect_request("/listing").respond_with_json({"meta": {"next": None}, "objects": []})
+
+    meta = {}
+    with requests.get(httpserver.url_for("/listing"), stream=True) as response:
+        assert list(decode.iter_listing(response, meta)) == []
+    assert meta == {"next": None}
@@ -0,0 +1,127 @@
+import json
+import re
+
+import pytest
+
+from pexip.context import RunContext
+from pexip.core import DELETED, FAILED, IN_USE, NOT_FOUND, delete_batch
+from pexip.models import PexipClient
+
+from conftest import listing
+
+NODE_ROUTE = "/api/admin/configuration/v1/worker_vm/"
+
+
+def test_delete_batch(httpserver, make_transcoder):
+    """ Test hostnames are resolved from one listing and busy nodes are skipped """
+    httpserver.expect_request(NODE_ROUTE, method="GET").respond_with_json(
+        listing(
+            {"id": 1, "name": "node01", "address": "10.0.0.1"},
+            {"id": 2, "name": "node02", "address": "10.0.0.2"},
+            {"id": 3, "name": "node03", "address": "10.0.0.3"},
+            {"id": 4, "name": "node04", "address": "10.0.0.4"},
+        )
+    )
+    httpserver.expect_request(re.compile(".*/participant/")).respond_with_json(
+        listing({"id": "abc", "node": "10.0.0.3"})
+    )
+    httpserver.expect_request(f"{NODE_ROUTE}1/", method="DELETE").respond_with_data(status=204)
+    httpserver.expect_request(f"{NODE_ROUTE}2/", method="DELETE").respond_with_data(status=204)
+    httpserver.expect_request(f"{NODE_ROUTE}4/", method="DELETE").respond_with_data(status=500)
+
+    context = RunContext()
+    transcoders = [make_transcoder(f"node0{i}") for i in range(1, 6)]
+    results = delete_batch(
+        transcoders,
+        PexipClient(transcoders[0], context=context),
+        parallel=4,
+        context=context,
+        check_active_calls=True,
+    )
+
+    assert {hostname: outcome for hostname, (outcome, _) in results.items()} == {
+        "node01": DELETED,
+        "node02": DELETED,
+        "node03": IN_USE,
+        "node04": FAILED,
+        "node05": NOT_FOUND,
+    }
+    assert len([req for req, _ in httpserver.log if req.method == "GET"]) == 2
+
+
+def test_delete_fans_out_across_managers(tmp_path, monkeypatch, capsys):
+    """ Test one run deletes nodes from several Managers and summarizes every Manager """
+    from pexip.config import get_default_config_dir
+    from pexip.core import main
+
+    from simulator import FakeManager
+
+    with FakeManager(nodes=3) as eu, FakeManager(nodes=3) as us:
+        for name, manager in (("eu", eu), ("us", us)):
+            config = {"MANAGER_URL": manager.url, "AUTH_PASS": "admin"}
+            (tmp_path / f"{name}.config.json").write_text(json.dumps(config))
+        nodes = [
+            {"hostname": "existing00001", "manager": "eu"},
+            {"hostname": "existing00002", "manager_url": us.url},
+            {"hostname": "missing", "manager": "us"},
+        ]
+        monkeypatch.setenv("PEXIP_CONFIG_DIR", str(tmp_path))
+        get_default_config_dir.cache_clear()
+        try:
+            main(
+                ["pexip", "--config-file", "eu.config.json", "--config-file", "us.config.json"]
+                + ["delete", json.dumps(nodes)]
+            )
+        finally:
+            get_default_config_dir.cache_clear()
+
+    assert [obj["name"] for obj in eu.objects["node"]] == ["existing00000", "existing00002"]
+    assert [obj["name"] for obj in us.objects["node"]] == ["existing00000", "existing00001"]
+    output = capsys.readouterr().out
+    assert "Managers: 2 succeeded, 0 failed." in output
+    assert "  eu: ok, 1 deleted" in output
+    assert "  us: ok, 1 deleted, 1 not found" in output
+
+
+def test_delete_reports_unreachable_manager(capsys):
+    """ Test an unreachable Manager is reported as an error, rather than a traceback """
+    from pexip.core import main
+
+    with pytest.raises(SystemExit) as exit:
+        main(["pexip", "--manager-url", "http://127.0.0.1:1", "delete", "node01"])
+
+    assert exit.value.code == 1
+    assert "Error: Unable to reach the Manager at http://127.0.0.1:1." in capsys.readouterr().out
+
+
+def test_delete_requires_targets(capsys):
+    """ Test a delete naming neither a hostname nor an inventory is refused """
+    from pexip.core import main
+
+    with pytest.raises(SystemExit) as exit:
+        main(["pexip", "delete"])
+
+    assert exit.value.code == 2
+    assert "'delete' requires a hostname or --inventory" in capsys.readouterr().err
+
+
+def test_fan_out_groups_output_by_manager(capsys):
+    """ Test what each Manager prints is kept together under its name, not interleaved """
+    import threading
+
+    from pexip.core import fan_out
+
+    both_started = threading.Barrier(2)
+
+    def _action(name):
+        print(f"{name} line 1")
+        both_started.wait(timeout=5)
+        print(f"{name} line 2")
+
+    fan_out(_action, {"eu": "eu", "us": "us"})
+
+    lines = capsys.readouterr().out.splitlines()
+    for name in ("eu", "us"):
+        header = lines.index(f"== {name} ==")
+        assert lines[header + 1 : header + 3] == [f"{name} line 1", f"{name} line 2"]
+    assert "Managers: 2 succeeded, 0 failed." in lines
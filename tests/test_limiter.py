@@ -0,0 +1,55 @@
+import time
+
+from pexip.context import RunContext
+from pexip.limiter import ManagerLimiter, parse_retry_after
+from pexip.models import PexipClient
+
+from conftest import listing
+
+
+def test_limiter_backs_off_and_recovers():
+    """ Test concurrency is halved on an error and grows back with healthy responses """
+    limiter = ManagerLimiter(max_concurrency=8, slow_response=0)
+    limiter.acquire()
+    limiter.release(status=503)
+    assert limiter.limit == 4
+
+    while limiter.limit < 8:
+        limiter.acquire()
+        limiter.release(status=200)
+    assert limiter.limit == 8
+
+
+def test_limiter_token_bucket():
+    """ Test requests beyond the burst are paced at 'rate' per second """
+    limiter = ManagerLimiter(rate=20, burst=2)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+        limiter.release(status=200)
+
+    assert time.monotonic() - start >= 0.19
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after(None) is None
+
+
+def test_request_honours_retry_after(httpserver, make_transcoder):
+    """ Test a request answered with Retry-After is sent again once it has passed """
+    httpserver.expect_ordered_request("/api/admin/configuration/v1/worker_vm/").respond_with_data(
+        "Busy", status=503, headers={"Retry-After": "0.2"}
+    )
+    httpserver.expect_ordered_request("/api/admin/configuration/v1/worker_vm/").respond_with_json(
+        listing({"id": 1, "name": "node01"})
+    )
+
+    client = PexipClient(make_transcoder("node01"), context=RunContext())
+    start = time.monotonic()
+    nodes = list(client._iter_config("node"))
+
+    assert nodes == [{"id": 1, "name": "node01"}]
+    assert time.monotonic() - start >= 0.2
+    assert len(httpserver.log) == 2
@@ -0,0 +1,56 @@
+import pytest
+
+from pexip import metrics
+from pexip.context import RunContext
+from pexip.core import CREATED, create_batch
+from pexip.provision import BootstrapPipeline
+from pexip.models import PexipClient
+
+from simulator import FakeBootstrap, FakeManager
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = metrics.Registry()
+    monkeypatch.setattr(metrics, "registry", registry)
+    return registry
+
+
+def test_metrics_of_a_batch(registry, make_transcoder, tmp_path):
+    """ Test requests, latencies, bootstrap retries and node times are all recorded """
+    with FakeManager() as manager, FakeBootstrap(failure_rate=0.5, seed=1) as bootstrap:
+        transcoders = [make_transcoder(f"node{i:02}", manager_url=manager.url) for i in range(4)]
+        context = RunContext()
+        pipeline = BootstrapPipeline(url=bootstrap.url, port=bootstrap.port, poll_interval=0.01)
+        results = create_batch(transcoders, parallel=2, context=context, pipeline=pipeline)
+
+    assert {outcome for outcome, _ in results.values()} == {CREATED}
+    requests = registry.counters["pexip_http_requests"]
+    posts = ("method", "POST"), ("route", "node"), ("status", 201), ("target", "manager")
+    assert requests[posts] == 4
+    assert registry.counters["pexip_bootstrap_retries"][()] == bootstrap.requests - 4
+    retries = registry.counters["pexip_http_retries"]
+    assert retries[(("route", "bootstrap"), ("target", "bootstrap"))] == bootstrap.requests - 4
+    (node_times,) = registry.histograms["pexip_node_provisioning_seconds"].values()
+    assert node_times[-1] == 4
+
+    registry.write(tmp_path / "pexip.prom")
+    text = (tmp_path / "pexip.prom").read_text()
+    assert 'pexip_http_requests_total{method="POST",route="node",status="201"' in text
+    assert 'pexip_node_provisioning_seconds_bucket{outcome="created",le="+Inf"} 4' in text
+    assert text.endswith("# EOF\n")
+
+
+def test_retry_after_is_counted(registry, httpserver, make_transcoder):
+    """ Test requests sent again after a Manager's Retry-After are counted by route """
+    route = "/api/admin/configuration/v1/worker_vm/"
+    httpserver.expect_ordered_request(route).respond_with_data(
+        "Busy", status=503, headers={"Retry-After": "0"}
+    )
+    httpserver.expect_ordered_request(route).respond_with_json({"meta": {}, "objects": []})
+
+    client = PexipClient(make_transcoder("node01"), context=RunContext())
+    assert list(client._iter_config("node")) == []
+
+    retries = registry.counters["pexip_http_retries"]
+    assert retries[(("route", "node"), ("target", "manager"))] == 1
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from pexip.core import main
+from pexip.preflight import preflight
+
+
+def test_preflight_finds_every_problem(make_transcoder):
+    """ Test a batch is checked as a whole, against every other node """
+    def _node(i, hostname, **kwargs):
+        options = {"private_ip": f"10.0.0.{i}", "public_ip": f"52.0.0.{i}", "gateway": "10.0.0.254"}
+        return make_transcoder(hostname, **{**options, **kwargs})
+
+    nodes = [
+        _node(1, "node01"),
+        _node(2, "node02", gateway="10.0.1.254"),
+        _node(3, "node01"),
+        _node(4, "node04", private_ip="10.0.0.1"),
+        _node(5, "node05", domain=None, public_ip="52.0.0", gateway="10.0.0.254x"),
+    ]
+
+    problems = preflight(nodes)
+
+    assert problems == [
+        ("node02", "gateway 10.0.1.254 is outside 10.0.0.0/24"),
+        ("node01", "duplicate hostname, also node #1"),
+        ("node04", "private_ip 10.0.0.1 is already used by node01"),
+        ("node05", "missing domain"),
+        ("node05", "invalid public_ip '52.0.0'"),
+        ("node05", "invalid gateway '10.0.0.254x'"),
+    ]
+
+
+def test_invalid_batch_fails_before_any_request(httpserver, capsys):
+    """ Test a bad batch is rejected without contacting the Manager """
+    nodes = json.dumps(
+        [
+            {"hostname": f"node{i:02}", "private_ip": f"10.0.0.{i}", "public_ip": f"52.0.0.{i}"}
+            for i in range(1, 4)
+        ]
+        + [{"hostname": "node01", "private_ip": "10.0.0.9", "public_ip": "52.0.0.9"}]
+    )
+    args = ["pexip", "--manager-url", httpserver.url_for(""), "create", nodes]
+    args += ["--domain", "company.com", "--netmask", "255.255.255.0", "--gateway", "10.0.0.254"]
+    args += ["--node-password", "x", "--tls-certificate-subject-name", "*.company.com"]
+    args += ["--system-location-name", "production"]
+
+    with pytest.raises(SystemExit):
+        main(args)
+
+    assert "node01: duplicate hostname" in capsys.readouterr().out
+    assert not httpserver.log
@@ -0,0 +1,103 @@
+import os
+import stat
+import socket
+
+from pexip.exceptions import ProvisioningError
+from pexip.models import drain_spool
+from pexip.payload import BootstrapPayload
+from pexip.provision import BootstrapPipeline
+from pexip.spool import Spool
+
+BOOTSTRAP_ROUTE = "/configuration/bootstrap"
+
+
+def _pipeline(httpserver, **kwargs):
+    return BootstrapPipeline(
+        url="http://{address}:{port}" + BOOTSTRAP_ROUTE,
+        port=httpserver.port,
+        poll_interval=0.05,
+        **kwargs,
+    )
+
+
+def _closed_port():
+    """ Find a local port with nothing listening on it. """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_bootstrap_retries_until_ready(httpserver):
+    """ Test a node answering 503 is polled again until it accepts its config """
+    httpserver.expect_ordered_request(BOOTSTRAP_ROUTE, method="POST").respond_with_data(
+        "Starting", status=503
+    )
+    httpserver.expect_ordered_request(BOOTSTRAP_ROUTE, method="POST").respond_with_data("OK")
+
+    with _pipeline(httpserver, deadline=5) as pipeline:
+        future = pipeline.submit("node01", "127.0.0.1", b"<xml/>")
+
+    assert future.result().status_code == 200
+    assert len(httpserver.log) == 2
+
+
+def test_bootstrap_gives_up_after_deadline():
+    """ Test an unreachable node fails once its deadline passes """
+    with BootstrapPipeline(port=_closed_port(), deadline=0.5, poll_interval=0.05) as pipeline:
+        unreachable = pipeline.submit("node01", "127.0.0.1", b"<xml/>")
+
+    assert isinstance(unreachable.exception(), ProvisioningError)
+
+
+def test_drain_spool(httpserver, tmp_path):
+    """ Test every spooled node is bootstrapped, and only failed entries are kept """
+    httpserver.expect_request(BOOTSTRAP_ROUTE, method="POST").respond_with_data("OK")
+    spool = Spool(tmp_path)
+    spool.enqueue("node01", "127.0.0.1", b"<xml>node01</xml>")
+    spool.enqueue("node02", "127.0.0.1", b"<xml>node02</xml>")
+    spool.enqueue("node03", "127.0.0.2", b"<xml>node03</xml>")
+
+    # Nothing listens on 127.0.0.2, so node03 is never bootstrapped.
+    results = drain_spool(spool, _pipeline(httpserver, deadline=0.5))
+
+    assert results["node01"] is None and results["node02"] is None
+    assert sorted(request.get_data() for request, _ in httpserver.log) == [
+        b"<xml>node01</xml>",
+        b"<xml>node02</xml>",
+    ]
+    (remaining,) = spool.entries()
+    assert remaining.hostname == "node03" and remaining.attempts == 1
+
+
+class _StreamedResponse:
+    def __init__(self, *chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+
+def test_bootstrap_streams_payload_from_disk(httpserver):
+    """ Test the Manager's XML is spooled to one temporary file, posted from it, then removed """
+    httpserver.expect_request(BOOTSTRAP_ROUTE, method="POST").respond_with_data("OK")
+    payload = BootstrapPayload.from_response(_StreamedResponse(b"<xml>", b"node01", b"</xml>"))
+    assert payload.temporary and payload.read() == b"<xml>node01</xml>"
+
+    with _pipeline(httpserver, deadline=5) as pipeline:
+        future = pipeline.submit("node01", "127.0.0.1", payload)
+
+    assert future.result().status_code == 200
+    assert httpserver.log[0][0].get_data() == b"<xml>node01</xml>"
+    payload.discard()
+    assert not payload.path.exists()
+
+
+def test_payload_is_private(tmp_path):
+    """ Test a bootstrap XML, holding the node's password, is readable only by its owner """
+    temporary = BootstrapPayload.from_response(_StreamedResponse(b"<xml>", b"</xml>"))
+    named = BootstrapPayload.from_response(_StreamedResponse(b"<xml/>"), tmp_path / "node.xml")
+    try:
+        assert stat.S_IMODE(os.stat(temporary.path).st_mode) == 0o600
+        assert stat.S_IMODE(os.stat(named.path).st_mode) == 0o600
+    finally:
+        temporary.discard()
@@ -0,0 +1,90 @@
+import re
+
+import pytest
+
+from pexip.context import RunContext
+from pexip.core import BatchFailed, apply
+from pexip.models import PexipClient
+from pexip.reconcile import compute_plan
+
+from conftest import listing
+
+LOCATION = "/api/admin/configuration/v1/system_location/2/"
+
+
+def _worker_vm(i, location=LOCATION):
+    return {
+        "id": i,
+        "name": f"node{i:03}",
+        "address": f"10.0.0.{i}",
+        "static_nat_address": f"52.0.0.{i}",
+        "netmask": "255.255.255.0",
+        "gateway": "10.0.0.254",
+        "domain": "company.com",
+        "system_location": location,
+    }
+
+
+def _desired(make_transcoder, i):
+    return make_transcoder(
+        f"node{i:03}",
+        private_ip=f"10.0.0.{i}",
+        public_ip=f"52.0.0.{i}",
+        gateway="10.0.0.254",
+    )
+
+
+def _manager(httpserver, *nodes):
+    httpserver.expect_request(re.compile(".*/worker_vm/")).respond_with_json(listing(*nodes))
+    httpserver.expect_request(re.compile(".*/tls_certificate/")).respond_with_json(
+        listing({"id": 1, "subject_name": "*.company.com"})
+    )
+    httpserver.expect_request(re.compile(".*/system_location/")).respond_with_json(
+        listing({"id": 2, "name": "production"}, {"id": 3, "name": "staging"})
+    )
+
+
+def test_plan_unchanged_fleet(httpserver, make_transcoder):
+    """ Test an unchanged fleet is planned from one request per listing """
+    _manager(httpserver, *[_worker_vm(i) for i in range(1, 201)])
+    desired = [_desired(make_transcoder, i) for i in range(1, 201)]
+
+    client = PexipClient(desired[0], context=RunContext())
+    plan = compute_plan(desired, client, prune=True)
+
+    assert plan.empty
+    assert len(plan.unchanged) == 200
+    assert len(httpserver.log) == 3
+
+
+def test_plan_diff(httpserver, make_transcoder):
+    """ Test missing nodes are created, and only undesired nodes in the same location pruned """
+    _manager(
+        httpserver,
+        _worker_vm(1),
+        {**_worker_vm(2), "address": "10.0.0.99"},
+        _worker_vm(3),
+        _worker_vm(4, location="/api/admin/configuration/v1/system_location/3/"),
+    )
+    desired = [_desired(make_transcoder, i) for i in (1, 2, 5)]
+    desired.append(make_transcoder("node006", system_location_name="missing"))
+
+    client = PexipClient(desired[0], context=RunContext())
+    plan = compute_plan(desired, client, prune=True)
+
+    assert [node.hostname for node in plan.to_create] == ["node005"]
+    assert [node.hostname for node, _ in plan.to_delete] == ["node003"]
+    assert plan.unchanged == ["node001"]
+    assert [hostname for hostname, _ in plan.drifted] == ["node002"]
+    assert [hostname for hostname, _ in plan.invalid] == ["node006"]
+
+
+def test_apply_fails_on_invalid_nodes(httpserver, make_transcoder):
+    """ Test invalid desired nodes fail an apply, even with nothing else to change """
+    _manager(httpserver, _worker_vm(1))
+    desired = [_desired(make_transcoder, 1), make_transcoder("node002", system_location_name="x")]
+
+    with pytest.raises(BatchFailed):
+        apply(desired)
+
+    assert not [req for req, _ in httpserver.log if req.method != "GET"]
@@ -0,0 +1,133 @@
+import json
+import threading
+
+from pexip.cli.args import parser
+from pexip.core import main
+from pexip.serve import Daemon, make_server
+
+from simulator import FakeManager
+
+
+def _delete(socket_path, manager, hostnames):
+    main(
+        ["pexip", "--server", f"unix:{socket_path}", "--manager-url", manager.url]
+        + ["delete", json.dumps(hostnames), "-p", "admin"]
+    )
+
+
+def test_serve_keeps_lookups_warm(tmp_path, capsys):
+    """ Test forwarded commands share the daemon's Manager listings between them """
+    socket_path = str(tmp_path / "serve.sock")
+    data, _ = parser.parse_args(["serve", "--socket", socket_path])
+    daemon = Daemon.from_args(data)
+    server = make_server(daemon, socket_path=socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with FakeManager(nodes=5) as manager:
+            _delete(socket_path, manager, ["existing00001"])
+            _delete(socket_path, manager, ["existing00002", "missing"])
+    finally:
+        server.shutdown()
+        server.server_close()
+        daemon.close()
+
+    assert [obj["name"] for obj in manager.objects["node"]] == [
+        "existing00000",
+        "existing00003",
+        "existing00004",
+    ]
+    # The node listing was fetched by the first command only.
+    assert manager.requests[("GET", "node")] == 1
+    output = capsys.readouterr().out
+    assert "Summary: 1 deleted, 1 not found, 0 skipped with active calls, 0 failed." in output
+
+
+def test_runs_locally_without_daemon(tmp_path, capsys):
+    """ Test a command runs within the CLI when no daemon is listening """
+    with FakeManager(nodes=2) as manager:
+        _delete(tmp_path / "missing.sock", manager, ["existing00001"])
+
+    assert [obj["name"] for obj in manager.objects["node"]] == ["existing00000"]
+    assert "Running locally." in capsys.readouterr().out
+
+
+def test_serve_port_refuses_untrusted_requests(tmp_path):
+    """Test a daemon on a port only accepts JSON requests carrying its token, never from a
+    web page, and never uses paths sent by a request"""
+    from http.client import HTTPConnection
+
+    data, _ = parser.parse_args(["--spool-dir", str(tmp_path), "serve", "--port", "0"])
+    daemon = Daemon.from_args(data)
+    requests = []
+    daemon.bootstrap = lambda options, nodes, request: requests.append(options) or {
+        "results": {}
+    }
+    server = make_server(daemon, host="127.0.0.1", port=0, token="secret")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def post(body, **headers):
+        connection = HTTPConnection("127.0.0.1", server.server_address[1])
+        connection.request("POST", "/v1/bootstrap", body=json.dumps(body), headers=headers)
+        return connection.getresponse().status
+
+    body = {"options": {"node_address": "10.0.0.1", "spool_dir": "/etc", "xml_file": "/a"}}
+    json_headers = {"Content-Type": "application/json"}
+    try:
+        assert post(body, **{"Content-Type": "text/plain", "Authorization": "Bearer secret"}) == 415
+        assert post(body, **json_headers) == 401
+        assert post(body, **json_headers, Authorization="Bearer wrong") == 401
+        assert post(body, **json_headers, Authorization="Bearer secret", Origin="http://a") == 403
+        assert not requests
+        assert post(body, **json_headers, Authorization="Bearer secret") == 200
+    finally:
+        server.shutdown()
+        server.server_close()
+        daemon.close()
+
+    assert requests[0].node_address == "10.0.0.1"
+    assert requests[0].spool_dir == str(tmp_path)
+    assert requests[0].xml_file is None
+
+
+def test_serve_deletes_node_it_created(tmp_path):
+    """ Test a node created through the daemon can be deleted while its listings are warm """
+    from pexip.context import RunContext
+    from pexip.definitions import LOOKUP_LISTING
+    from pexip.provision import BootstrapPipeline
+
+    from simulator import FakeBootstrap, SYSTEM_LOCATION, TLS_CERTIFICATE
+
+    with FakeManager(nodes=2) as manager, FakeBootstrap() as bootstrap:
+        pipeline = BootstrapPipeline(
+            url=bootstrap.url, port=bootstrap.port, poll_interval=0.05, deadline=10
+        )
+        daemon = Daemon(RunContext(lookup=LOOKUP_LISTING), pipeline)
+        options = {
+            "manager_url": manager.url,
+            "auth_user": "admin",
+            "auth_pass": "admin",
+            "spool_dir": str(tmp_path),
+        }
+        node = {
+            "hostname": "new01",
+            "domain": "company.com",
+            "private_ip": "127.0.0.1",
+            "public_ip": "52.41.93.113",
+            "netmask": "255.255.255.0",
+            "gateway": "127.0.0.254",
+            "node_password": "secret",
+            "tls_certificate_subject_name": TLS_CERTIFICATE,
+            "system_location_name": SYSTEM_LOCATION,
+        }
+        try:
+            created = daemon.handle("create", {"options": options, "nodes": [node]})
+            deleted = daemon.handle(
+                "delete", {"options": options, "nodes": [{"hostname": "new01"}]}
+            )
+        finally:
+            daemon.close()
+
+    assert created["results"] == {"new01": ["created", None]}
+    assert deleted["results"] == {"new01": ["deleted", None]}
+    assert [obj["name"] for obj in manager.objects["node"]] == ["existing00000", "existing00001"]
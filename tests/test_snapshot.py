@@ -0,0 +1,59 @@
+from pexip.cache import LookupCache
+from pexip.context import RunContext
+from pexip.definitions import API_MAP
+from pexip.models import PexipClient
+from pexip.reconcile import compute_plan
+from pexip.snapshot import Snapshot
+
+from simulator import FakeManager, SYSTEM_LOCATION
+
+
+def test_snapshot_round_trip(tmp_path, make_transcoder):
+    """ Test every listing is fetched in full, and survives being written and read back """
+    with FakeManager(nodes=250) as manager:
+        args = make_transcoder("node01", manager_url=manager.url, page_size=100)
+        client = PexipClient(args, context=RunContext())
+        snapshot = Snapshot.take(client, parallel=4)
+
+    assert set(snapshot.objects) == set(API_MAP) and not snapshot.errors
+    assert len(snapshot.objects["node"]) == 250
+    assert manager.requests[("GET", "node")] == 3
+
+    snapshot.write(tmp_path / "snapshot.json.gz")
+    loaded = Snapshot.read(tmp_path / "snapshot.json.gz")
+    assert loaded.objects == snapshot.objects
+    assert loaded.manager_url == manager.url
+
+
+def test_plan_from_snapshot_is_offline(make_transcoder):
+    """ Test a plan computed from a snapshot sends no requests to the Manager """
+    with FakeManager(nodes=3) as manager:
+        args = make_transcoder("node01", manager_url=manager.url)
+        snapshot = Snapshot.take(PexipClient(args, context=RunContext()))
+        manager.requests.clear()
+
+        context = RunContext(cache=LookupCache(snapshot=snapshot))
+        desired = [
+            make_transcoder(
+                hostname, manager_url=manager.url, private_ip="10.0.1.1", gateway="10.0.1.254"
+            )
+            for hostname in ("existing00001", "new01")
+        ]
+        plan = compute_plan(desired, PexipClient(desired[0], context=context))
+
+    assert [node.hostname for node in plan.to_create] == ["new01"]
+    assert manager.total_requests == 0
+
+
+def test_snapshot_of_another_manager_is_ignored(capsys, make_transcoder):
+    """ Test a snapshot is only used for the Manager it was taken of """
+    with FakeManager(nodes=3) as manager:
+        snapshot = Snapshot(manager_url="https://other.company.com", objects={"node": []})
+        context = RunContext(cache=LookupCache(snapshot=snapshot))
+        client = PexipClient(make_transcoder("node01", manager_url=manager.url), context=context)
+
+        assert context.cache.lookup(client, "node", "name", "existing00001") is not None
+        assert context.cache.lookup(client, "system_location", "name", SYSTEM_LOCATION) is not None
+
+    assert manager.requests[("GET", "node")] == 1
+    assert capsys.readouterr().out.count("Warning: The snapshot was taken of") == 1
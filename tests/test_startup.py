@@ -0,0 +1,52 @@
+"""
+Import time benchmarks for the CLI, which Terraform runs once per node.
+"""
+import os
+import sys
+import subprocess
+
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# Modules only needed once a subcommand talks to the network.
+HEAVY_MODULES = ["requests", "urllib3", "concurrent.futures.thread"]
+
+# Cumulative import time budget for the CLI entry point.
+IMPORT_BUDGET_MS = float(os.environ.get("PEXIP_IMPORT_BUDGET_MS", 150))
+
+
+def _importtime(*args):
+    """ Run the CLI with '-X importtime', returning {module: cumulative microseconds}. """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PEXIP_CONFIG_DIR": str(ROOT / "tests")},
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line.split("|")
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_help_skips_heavy_imports():
+    """ Test '--help' parses arguments without importing requests """
+    times = _importtime("-m", "pexip", "create", "--help")
+
+    assert not [module for module in HEAVY_MODULES if module in times]
+
+
+def test_import_time_budget():
+    """ Test the CLI entry point imports within its time budget """
+    times = _importtime("-c", "import pexip.core, pexip.cli.args")
+    elapsed_ms = (times["pexip.core"] + times["pexip.cli.args"]) / 1000
+    print(f"pexip import time: {elapsed_ms:.1f}ms")
+
+    assert not [module for module in HEAVY_MODULES if module in times]
+    assert elapsed_ms < IMPORT_BUDGET_MS
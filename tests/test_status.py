@@ -0,0 +1,90 @@
+from pexip import status
+from pexip.context import RunContext
+from pexip.models import PexipClient
+from pexip.status import FleetStatus
+
+from simulator import FakeManager
+
+
+def test_status_refresh_is_one_sweep(monkeypatch, make_transcoder):
+    """Test a refresh lists the whole fleet in one request per endpoint, probes every node,
+    and incremental refreshes only stop probing nodes once they are reachable and synced"""
+    probes = []
+
+    def is_reachable(address, port, timeout):
+        probes.append(address)
+        return address.endswith("1")
+
+    monkeypatch.setattr(status, "is_reachable", is_reachable)
+    with FakeManager(nodes=200) as manager:
+        for node in manager.objects["node"]:
+            manager.objects["node_status"].append(
+                {"name": node["name"], "sync_status": "SYNCED", "version": "33"}
+            )
+        args = make_transcoder("node01", manager_url=manager.url)
+        fleet = FleetStatus(PexipClient(args, context=RunContext()))
+        try:
+            assert len(fleet.refresh()) == 200
+            assert manager.requests[("GET", "node_status")] == 1
+            assert manager.requests[("GET", "node")] == 1
+            assert len(probes) == 200
+            assert sum(1 for node in fleet.nodes.values() if node.reachable) == 20
+
+            manager.objects["node_status"][1]["sync_status"] = "SYNCING"
+            assert [node.name for node in fleet.refresh(incremental=True)] == ["existing00001"]
+            assert not fleet.refresh(incremental=True)
+            manager.objects["node"].append({"id": 999, "name": "new01", "address": "10.9.9.1"})
+            probes.clear()
+            changed = fleet.refresh(incremental=True)
+        finally:
+            fleet.close()
+
+    # A node created since the first refresh is picked up.
+    assert [node.name for node in changed] == ["new01"]
+    # Reachable, synced nodes settled: only those unreachable or syncing are still probed.
+    assert len(probes) == 180 + 2
+    assert "10.0.0.1" in probes and "10.0.0.11" not in probes
+    assert not fleet.settled
+
+
+def test_incremental_refresh_lists_updated_nodes(monkeypatch, make_transcoder):
+    """ Test incremental refreshes only list the status of nodes updated since the last one """
+    monkeypatch.setattr(status, "is_reachable", lambda address, port, timeout: True)
+    with FakeManager(nodes=200) as manager:
+        rows = manager.objects["node_status"]
+        for i, node in enumerate(manager.objects["node"]):
+            updated = f"2026-10-18T10:00:00.{i:06}"
+            rows.append({"name": node["name"], "sync_status": "SYNCED", "last_updated": updated})
+        rows[7].update(sync_status="SYNCING")
+        args = make_transcoder("node01", manager_url=manager.url)
+        fleet = FleetStatus(PexipClient(args, context=RunContext()))
+        listed = []
+        list_all = fleet._list
+
+        def _list(endpoint, **filters):
+            listed.append(list_all(endpoint, **filters))
+            return listed[-1]
+
+        monkeypatch.setattr(fleet, "_list", _list)
+        try:
+            fleet.refresh()
+            manager.requests.clear()
+            rows[7].update(sync_status="SYNCED", last_updated="2026-10-18T10:00:05")
+            changed = fleet.refresh(incremental=True)
+            assert manager.requests == {("GET", "node_status"): 1}
+            # Only the last node of the previous refresh, and the one updated since.
+            assert len(listed[-1]) == 2
+
+            manager.objects["node"].append({"id": 999, "name": "new01", "address": "10.9.9.1"})
+            rows.append(
+                {"name": "new01", "sync_status": "SYNCING", "last_updated": "2026-10-18T10:00:09"}
+            )
+            manager.requests.clear()
+            added = fleet.refresh(incremental=True)
+            assert manager.requests == {("GET", "node_status"): 1, ("GET", "node"): 1}
+        finally:
+            fleet.close()
+
+    assert [node.name for node in changed] == ["existing00007"]
+    assert [node.name for node in added] == ["new01"]
+    assert fleet.nodes["existing00008"].status["sync_status"] == "SYNCED"